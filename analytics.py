@@ -0,0 +1,243 @@
+import numpy as np
+
+import scoring
+
+SECONDS_PER_DAY = 86400
+
+# Running aggregates over all stored submissions. They are updated in the same transaction as the
+# submissions themselves, so reading them never requires scanning the response history.
+# Per-DMF counts, sums and sums of squares all follow from the level histogram. The CI is linear in the
+# category averages (unanswered categories count as 0), so instead of CI values the aggregates keep
+# category totals per project and day, and per-project sums of products of category averages: the CI
+# mean, variance and trend then follow for whatever weight set a project is scored with.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS agg_dmf_levels (
+    project_id INTEGER NOT NULL,
+    dmf INTEGER NOT NULL,
+    level INTEGER NOT NULL,
+    n INTEGER NOT NULL,
+    PRIMARY KEY (project_id, dmf, level)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS agg_categories (
+    project_id INTEGER NOT NULL,
+    category INTEGER NOT NULL,
+    n INTEGER NOT NULL,
+    total REAL NOT NULL,
+    total_sq REAL NOT NULL,
+    PRIMARY KEY (project_id, category)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS agg_daily (
+    project_id INTEGER NOT NULL,
+    day INTEGER NOT NULL,
+    n INTEGER NOT NULL,
+    PRIMARY KEY (project_id, day)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS agg_category_daily (
+    project_id INTEGER NOT NULL,
+    day INTEGER NOT NULL,
+    category INTEGER NOT NULL,
+    total REAL NOT NULL,
+    PRIMARY KEY (project_id, day, category)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS agg_category_products (
+    project_id INTEGER NOT NULL,
+    category_a INTEGER NOT NULL,
+    category_b INTEGER NOT NULL,
+    total REAL NOT NULL,
+    PRIMARY KEY (project_id, category_a, category_b)
+) WITHOUT ROWID;
+"""
+
+# Bumped whenever the aggregate definitions change, so existing databases are rebuilt once
+AGGREGATES_VERSION = 2
+
+# Tables of earlier aggregate versions, dropped by the rebuild
+_OBSOLETE_TABLES = ("agg_ci_daily",)
+
+
+# Add a batch of submissions to the running aggregates (or remove them again with sign=-1).
+# project_ids and submitted_at have one entry per submission; matrix is (submissions x DMF) with NaN
+# for unanswered DMFs.
+def update_aggregates(cursor, project_ids, submitted_at, matrix, sign=1):
+    project_ids = np.asarray(project_ids, dtype=np.int64)
+    days = np.asarray(submitted_at, dtype=np.int64) // SECONDS_PER_DAY
+    matrix = np.asarray(matrix, dtype=float)
+    averages = scoring.category_averages(matrix)
+
+    # Level histogram per (project, DMF, level)
+    rows, dmfs = np.nonzero(~np.isnan(matrix))
+    keys, counts = np.unique(
+        np.stack([project_ids[rows], dmfs, matrix[rows, dmfs].astype(np.int64)], axis=1), axis=0, return_counts=True)
+    cursor.executemany(
+        "INSERT INTO agg_dmf_levels (project_id, dmf, level, n) VALUES (?, ?, ?, ?) "
+        "ON CONFLICT (project_id, dmf, level) DO UPDATE SET n = n + excluded.n",
+        [(int(p), int(d), int(l), sign * int(n)) for (p, d, l), n in zip(keys, counts)])
+
+    # Category averages per (project, category), skipping categories a respondent left blank
+    rows, categories = np.nonzero(~np.isnan(averages))
+    values = averages[rows, categories]
+    keys, inverse = np.unique(np.stack([project_ids[rows], categories], axis=1), axis=0, return_inverse=True)
+    inverse = inverse.ravel()
+    cursor.executemany(
+        "INSERT INTO agg_categories (project_id, category, n, total, total_sq) VALUES (?, ?, ?, ?, ?) "
+        "ON CONFLICT (project_id, category) DO UPDATE SET "
+        "n = n + excluded.n, total = total + excluded.total, total_sq = total_sq + excluded.total_sq",
+        [(int(p), int(c), sign * int(n), sign * float(s), sign * float(sq)) for (p, c), n, s, sq in zip(
+            keys, np.bincount(inverse, minlength=len(keys)),
+            np.bincount(inverse, values, minlength=len(keys)),
+            np.bincount(inverse, values ** 2, minlength=len(keys)))])
+
+    # Respondents and category totals per (project, day), for the CI mean and trend
+    filled = np.nan_to_num(averages, nan=0.0)
+    keys, inverse = np.unique(np.stack([project_ids, days], axis=1), axis=0, return_inverse=True)
+    inverse = inverse.ravel()
+    cursor.executemany(
+        "INSERT INTO agg_daily (project_id, day, n) VALUES (?, ?, ?) "
+        "ON CONFLICT (project_id, day) DO UPDATE SET n = n + excluded.n",
+        [(int(p), int(d), sign * int(n)) for (p, d), n in zip(keys, np.bincount(inverse, minlength=len(keys)))])
+    totals = np.column_stack([np.bincount(inverse, filled[:, c], minlength=len(keys)) for c in range(filled.shape[1])])
+    cursor.executemany(
+        "INSERT INTO agg_category_daily (project_id, day, category, total) VALUES (?, ?, ?, ?) "
+        "ON CONFLICT (project_id, day, category) DO UPDATE SET total = total + excluded.total",
+        [(int(p), int(d), c, sign * float(totals[k, c])) for k, (p, d) in enumerate(keys)
+         for c in range(filled.shape[1])])
+
+    # Sums of products of category averages per project (upper triangle), for the CI variance
+    keys, inverse = np.unique(project_ids, return_inverse=True)
+    inverse = inverse.ravel()
+    category_a, category_b = np.triu_indices(filled.shape[1])
+    products = filled[:, category_a] * filled[:, category_b]
+    totals = np.column_stack([np.bincount(inverse, products[:, k], minlength=len(keys))
+                              for k in range(len(category_a))])
+    cursor.executemany(
+        "INSERT INTO agg_category_products (project_id, category_a, category_b, total) VALUES (?, ?, ?, ?) "
+        "ON CONFLICT (project_id, category_a, category_b) DO UPDATE SET total = total + excluded.total",
+        [(int(p), int(a), int(b), sign * float(totals[i, k])) for i, p in enumerate(keys)
+         for k, (a, b) in enumerate(zip(category_a, category_b))])
+
+    if sign < 0:
+        # Drop the groups that no submission contributes to any more
+        for table in ("agg_dmf_levels", "agg_categories", "agg_daily"):
+            cursor.execute(f"DELETE FROM {table} WHERE n <= 0")
+        cursor.execute("DELETE FROM agg_category_daily WHERE NOT EXISTS (SELECT 1 FROM agg_daily d "
+                       "WHERE d.project_id = agg_category_daily.project_id AND d.day = agg_category_daily.day)")
+        cursor.execute("DELETE FROM agg_category_products WHERE project_id NOT IN (SELECT project_id FROM agg_daily)")
+
+
+# Recompute the aggregates from the stored submissions (one-off, for databases created before
+# the aggregates existed or after AGGREGATES_VERSION changes)
+def rebuild_aggregates(cursor, chunk_size=50000):
+    dmf_count = len(scoring.DMF_CODES)
+    for table in _OBSOLETE_TABLES:
+        cursor.execute(f"DROP TABLE IF EXISTS {table}")
+    for table in ("agg_dmf_levels", "agg_categories", "agg_daily", "agg_category_daily", "agg_category_products"):
+        cursor.execute(f"DELETE FROM {table}")
+    last_id = 0
+    while True:
+        submissions = cursor.execute(
+            "SELECT id, project_id, submitted_at FROM submissions WHERE id > ? ORDER BY id LIMIT ?",
+            (last_id, chunk_size)).fetchall()
+        if not submissions:
+            return
+        submissions = np.array(submissions, dtype=np.int64)
+        matrix = np.full((len(submissions), dmf_count), np.nan)
+        answers = cursor.execute(
+            "SELECT submission_id, dmf, level FROM responses WHERE submission_id BETWEEN ? AND ?",
+            (int(submissions[0, 0]), int(submissions[-1, 0]))).fetchall()
+        if answers:
+            answers = np.array(answers, dtype=np.int64)
+            matrix[np.searchsorted(submissions[:, 0], answers[:, 0]), answers[:, 1]] = answers[:, 2]
+        update_aggregates(cursor, submissions[:, 1], submissions[:, 2], matrix)
+        last_id = int(submissions[-1, 0])
+
+
+def _mean_and_variance(n, total, total_sq):
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = total / n
+        return mean, np.maximum(total_sq / n - mean ** 2, 0.0)
+
+
+# Summary of the aggregates for the dashboard, over all projects or a single one.
+# query(sql, parameters) runs a read-only query and returns its rows. weights_for_projects maps a list
+# of project names to their (projects x category) CI weights; by default every project uses the
+# knowledge base weights.
+def load_summary(query, dmf_count, category_count, project=None, weights_for_projects=None):
+    where, parameters = ("WHERE a.project_id = (SELECT id FROM projects WHERE name = ?)", (project,)) \
+        if project is not None else ("", ())
+
+    level_counts = np.zeros((dmf_count, 5), dtype=np.int64)
+    for dmf, level, n in query(f"SELECT dmf, level, SUM(n) FROM agg_dmf_levels a {where} GROUP BY dmf, level",
+                               parameters):
+        level_counts[dmf, level - 1] = n
+    levels = np.arange(1, 6)
+    dmf_n = level_counts.sum(axis=1)
+    dmf_mean, dmf_variance = _mean_and_variance(dmf_n, level_counts @ levels, level_counts @ levels ** 2)
+
+    category_stats = np.zeros((category_count, 3))
+    for category, n, total, total_sq in query(
+            f"SELECT category, SUM(n), SUM(total), SUM(total_sq) FROM agg_categories a {where} GROUP BY category",
+            parameters):
+        category_stats[category] = (n, total, total_sq)
+    category_mean, category_variance = _mean_and_variance(*category_stats.T)
+
+    # CI of every project from its category totals and its own weights
+    daily = query(f"SELECT p.name, a.day, a.n FROM agg_daily a JOIN projects p ON p.id = a.project_id {where} "
+                  f"ORDER BY a.day, p.name", parameters)
+    names = sorted({name for name, _, _ in daily})
+    project_index = {name: i for i, name in enumerate(names)}
+    if weights_for_projects is None or not names:
+        weights = np.tile(scoring.CATEGORY_WEIGHTS, (len(names), 1))
+    else:
+        weights = np.asarray(weights_for_projects(names), dtype=float).reshape(len(names), category_count)
+
+    day_index = {(name, day): i for i, (name, day, _) in enumerate(daily)}
+    day_totals = np.zeros((len(daily), category_count))
+    for name, day, category, total in query(
+            f"SELECT p.name, a.day, a.category, a.total FROM agg_category_daily a "
+            f"JOIN projects p ON p.id = a.project_id {where}", parameters):
+        if (name, day) in day_index:
+            day_totals[day_index[name, day], category] = total
+    day_n = np.array([n for _, _, n in daily], dtype=float)
+    day_weights = weights[[project_index[name] for name, _, _ in daily]].reshape(len(daily), category_count)
+    day_ci_totals = np.einsum("ij,ij->i", day_totals, day_weights)
+
+    products = np.zeros((len(names), category_count, category_count))
+    for name, category_a, category_b, total in query(
+            f"SELECT p.name, a.category_a, a.category_b, a.total FROM agg_category_products a "
+            f"JOIN projects p ON p.id = a.project_id {where}", parameters):
+        if name in project_index:
+            products[project_index[name], category_a, category_b] = total
+            products[project_index[name], category_b, category_a] = total
+    respondents = day_n.sum()
+    ci_mean, ci_variance = _mean_and_variance(respondents, day_ci_totals.sum(),
+                                              np.einsum("pi,pij,pj->", weights, products, weights))
+
+    return {
+        "respondents": int(respondents),
+        "ci_mean": ci_mean,
+        "ci_variance": ci_variance,
+        "dmf_level_counts": level_counts,
+        "dmf_n": dmf_n,
+        "dmf_mean": dmf_mean,
+        "dmf_variance": dmf_variance,
+        "category_n": category_stats[:, 0].astype(np.int64),
+        "category_mean": category_mean,
+        "category_variance": category_variance,
+        # (project, day, respondents, mean CI) per project and day
+        "ci_trend": [(name, day, n, total / n) for (name, day, n), total in zip(daily, day_ci_totals)],
+    }
+
+
+# Per-project DMF level histograms from the aggregates, for comparing projects without reading the
+# stored answers: (project names sorted, respondents per project, (projects x DMF x level) counts)
+def load_project_levels(query, dmf_count, levels=5):
+    respondents = dict(query("SELECT p.name, SUM(a.n) FROM agg_daily a JOIN projects p ON p.id = a.project_id "
+                             "GROUP BY p.name HAVING SUM(a.n) > 0"))
+    names = sorted(respondents)
+    index = {name: i for i, name in enumerate(names)}
+    level_counts = np.zeros((len(names), dmf_count, levels), dtype=np.int64)
+    for name, dmf, level, n in query("SELECT p.name, a.dmf, a.level, a.n FROM agg_dmf_levels a "
+                                     "JOIN projects p ON p.id = a.project_id"):
+        if name in index:
+            level_counts[index[name], dmf, level - 1] = n
+    return names, np.array([respondents[name] for name in names], dtype=np.int64), level_counts
@@ -0,0 +1,155 @@
+import argparse
+import gc
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_PATH = os.path.join(ROOT, "main.py")
+sys.path.insert(0, ROOT)
+
+RESPONDENT_COUNTS = [1, 10, 100, 1_000, 10_000, 100_000]
+
+# Metrics are all "lower is better"; a run regresses when a metric exceeds its baseline by more
+# than the threshold (relative) and by more than the absolute slack, which keeps tiny timings from
+# flagging noise
+DEFAULT_THRESHOLD = 0.25
+ABSOLUTE_SLACK = {"s": 0.0005, "mib": 1.0, "count": 0}
+
+
+def _live_figures():
+    from matplotlib.figure import Figure
+    return sum(isinstance(obj, Figure) for obj in gc.get_objects())
+
+
+# Run one AppTest rerun and record its wall time and peak traced memory
+def _timed_run(results, name, action):
+    tracemalloc.reset_peak()
+    started = time.perf_counter()
+    at = action()
+    results[f"app.{name}.rerun_s"] = time.perf_counter() - started
+    results[f"app.{name}.peak_mib"] = tracemalloc.get_traced_memory()[1] / 2 ** 20
+    if at.exception:
+        raise RuntimeError(f"{name}: {[exception.message for exception in at.exception]}")
+    return at
+
+
+# Drive the app headlessly: every sidebar page, a complete survey and the report
+def bench_app(results):
+    from streamlit.testing.v1 import AppTest
+
+    tracemalloc.start()
+    at = AppTest.from_file(APP_PATH, default_timeout=300)
+    _timed_run(results, "cover_page", at.run)
+    _timed_run(results, "data_collection", lambda: at.sidebar.radio[0].set_value("Data Collection").run())
+
+    # Answering only redraws the survey progress, so filling it in costs no page reruns until "Generate Report"
+    for i, selectbox in enumerate(at.selectbox):
+        selectbox.set_value(i % 5 + 1)
+
+    figures_before = _live_figures()
+    generate = next(button for button in at.button if button.label == "Generate Report")
+    _timed_run(results, "generate_report", generate.click().run)
+    _timed_run(results, "generate_report_repeat", at.run)
+    results["app.generate_report.figures_created_count"] = _live_figures() - figures_before
+    results["app.survey_reruns_count"] = at.session_state["survey_reruns"]
+
+    _timed_run(results, "portfolio_dashboard", lambda: at.sidebar.radio[0].set_value("Portfolio Dashboard").run())
+    _timed_run(results, "portfolio_comparison", lambda: at.sidebar.radio[0].set_value("Portfolio Comparison").run())
+    tracemalloc.stop()
+
+
+def _best_of(function, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+# CI scoring and radar rendering over growing numbers of respondents
+def bench_micro(results, respondent_counts):
+    import numpy as np
+
+    import portfolio
+    import radar
+    import scoring
+
+    rng = np.random.default_rng(0)
+    for n in respondent_counts:
+        matrix = rng.integers(1, 6, size=(n, len(scoring.DMF_CODES))).astype(float)
+        matrix[rng.random(matrix.shape) < 0.1] = np.nan
+        results[f"micro.score.{n}.s"] = _best_of(lambda: scoring.score(matrix))
+
+        projects = rng.integers(0, max(1, n // 50), size=n)
+        results[f"micro.project_scores.{n}.s"] = _best_of(lambda: portfolio.project_scores(projects, matrix))
+
+    radar.clear_cache()
+    values = rng.uniform(1, 5, size=len(scoring.CATEGORIES))
+    started = time.perf_counter()
+    radar.render_radar(scoring.CATEGORIES, values)
+    results["micro.radar.first_render.s"] = time.perf_counter() - started
+    results["micro.radar.render.s"] = _best_of(
+        lambda: radar.render_radar(scoring.CATEGORIES, rng.uniform(1, 5, size=len(scoring.CATEGORIES))))
+    results["micro.radar.cached.s"] = _best_of(lambda: radar.render_radar(scoring.CATEGORIES, values))
+
+
+def _unit(metric):
+    for unit in ABSOLUTE_SLACK:
+        if metric.endswith(unit):
+            return unit
+    return "s"
+
+
+# Metrics that got worse than the baseline by more than the threshold
+def find_regressions(results, baseline, threshold=DEFAULT_THRESHOLD):
+    regressions = []
+    for metric, value in results.items():
+        old = baseline.get(metric)
+        if old is None:
+            continue
+        if value > old * (1 + threshold) and value - old > ABSOLUTE_SLACK[_unit(metric)]:
+            regressions.append((metric, old, value))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the app headlessly and check for regressions.")
+    parser.add_argument("-o", "--output", default="bench_results.json", help="JSON file for the results")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="allowed relative slowdown before a metric counts as a regression")
+    parser.add_argument("--skip-app", action="store_true", help="only run the microbenchmarks")
+    parser.add_argument("--max-respondents", type=int, default=RESPONDENT_COUNTS[-1])
+    args = parser.parse_args(argv)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        # Keep the benchmark's survey submissions out of the real response database
+        os.environ["KBDSS_DB_PATH"] = os.path.join(directory, "bench.db")
+        if not args.skip_app:
+            bench_app(results)
+        bench_micro(results, [n for n in RESPONDENT_COUNTS if n <= args.max_respondents])
+
+    for metric, value in sorted(results.items()):
+        print(f"{metric:<50} {value:12.6f}")
+    with open(args.output, "w") as f:
+        json.dump({"benchmark": "app", "python": sys.version.split()[0], "results": results}, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        regressions = find_regressions(results, baseline, args.threshold)
+        for metric, old, new in regressions:
+            print(f"REGRESSION {metric}: {old:.6f} -> {new:.6f}")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions against {args.baseline} (threshold {args.threshold:.0%})")
+
+
+if __name__ == "__main__":
+    main()
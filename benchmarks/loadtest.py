@@ -0,0 +1,161 @@
+import argparse
+import gc
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_PATH = os.path.join(ROOT, "main.py")
+sys.path.insert(0, ROOT)
+
+PERCENTILES = [50, 90, 95, 99]
+
+# AppTest swaps a process-wide mock runtime in and out around every run, so reruns of different
+# sessions cannot overlap. Sessions run concurrently and take turns through this lock, much like
+# script threads of one server process taking turns on the GIL: latency = waiting + service time.
+_rerun_lock = threading.Lock()
+
+
+def _rss_mib():
+    import instrumentation
+
+    return instrumentation.rss_bytes() / 2 ** 20
+
+
+# One simulated respondent: open the app, fill in and submit the survey, then view the report twice,
+# pausing for an exponentially distributed think time before each interaction. Returns the
+# (step, latency, service time) of every rerun and the session state the server keeps afterwards.
+def run_session(session, rng, think_time=0.0):
+    from streamlit.testing.v1 import AppTest
+
+    latencies = []
+
+    def timed(step, action):
+        if think_time:
+            time.sleep(rng.exponential(think_time))
+        started = time.perf_counter()
+        with _rerun_lock:
+            running = time.perf_counter()
+            at = action()
+        finished = time.perf_counter()
+        latencies.append((step, finished - started, finished - running))
+        if at.exception:
+            raise RuntimeError(f"session {session}, {step}: {[exception.message for exception in at.exception]}")
+        return at
+
+    at = AppTest.from_file(APP_PATH, default_timeout=300)
+    timed("cover_page", at.run)
+    timed("data_collection", lambda: at.sidebar.radio[0].set_value("Data Collection").run())
+    at.text_input(key="project").set_value(f"Project {session % 20}")
+    for selectbox in at.selectbox:
+        if rng.random() > 0.1:
+            selectbox.set_value(int(rng.integers(1, 6)))
+    generate = next(button for button in at.button if button.label == "Generate Report")
+    timed("generate_report", generate.click().run)
+    timed("view_report", at.run)
+    return latencies, at.session_state
+
+
+# Size of each session state entry, measured like Streamlit's own session state memory stats
+def state_bytes(state):
+    from streamlit.vendor.pympler.asizeof import asizeof
+
+    return {key: asizeof(value) for key, value in state.to_dict().items()}
+
+
+def summarize(latencies):
+    summary = {}
+    for step in sorted({step for step, _, _ in latencies} | {"all"}):
+        rows = np.array([(latency, service) for name, latency, service in latencies if step in ("all", name)])
+        summary[step] = {"count": len(rows), "mean_s": float(rows[:, 0].mean()),
+                         "service_mean_s": float(rows[:, 1].mean()),
+                         **{f"p{q}_s": float(v) for q, v in zip(PERCENTILES, np.percentile(rows[:, 0], PERCENTILES))}}
+    return summary
+
+
+def run(sessions, concurrency, think_time=0.5, seed=0):
+    import streamlit.testing.v1  # noqa: F401  (imported before the memory baseline)
+
+    # A first session warms the shared caches (knowledge base, response store, imports)
+    run_session(-1, np.random.default_rng(seed))
+    gc.collect()
+    rss_before = _rss_mib()
+
+    latencies = []
+    states = []
+    lock = threading.Lock()
+
+    def simulate(session):
+        session_latencies, state = run_session(session, np.random.default_rng([seed, session]), think_time)
+        with lock:
+            latencies.extend(session_latencies)
+            states.append(state)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for future in [pool.submit(simulate, session) for session in range(sessions)]:
+            future.result()
+    elapsed = time.perf_counter() - started
+
+    # Only the session states stay referenced, as they would on a server holding open sessions
+    gc.collect()
+    rss_after = _rss_mib()
+    per_key = {}
+    for state in states:
+        for key, size in state_bytes(state).items():
+            per_key[key] = per_key.get(key, 0) + size
+    return {
+        "sessions": sessions,
+        "concurrency": concurrency,
+        "think_time_s": think_time,
+        "elapsed_s": elapsed,
+        "reruns_per_s": len(latencies) / elapsed,
+        "latency": summarize(latencies),
+        "rss_before_mib": rss_before,
+        "rss_after_mib": rss_after,
+        "rss_per_session_kib": (rss_after - rss_before) * 1024 / sessions,
+        "session_state_bytes": sum(per_key.values()) / sessions,
+        "session_state_bytes_by_key": {key: size / sessions for key, size in
+                                       sorted(per_key.items(), key=lambda item: -item[1])},
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate many concurrent survey sessions in one process and "
+                                                 "report rerun latency percentiles and memory per session.")
+    parser.add_argument("--sessions", type=int, default=200, help="number of simulated respondents")
+    parser.add_argument("--concurrency", type=int, default=32, help="sessions running at the same time")
+    parser.add_argument("--think-time", type=float, default=0.5,
+                        help="mean pause in seconds before each interaction of a session")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-o", "--output", help="write the results to this JSON file")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as directory:
+        # Keep the simulated submissions out of the real response database
+        os.environ["KBDSS_DB_PATH"] = os.path.join(directory, "loadtest.db")
+        result = run(args.sessions, args.concurrency, args.think_time, args.seed)
+
+    print(f"{result['sessions']} sessions, {result['concurrency']} concurrent, {result['elapsed_s']:.1f}s "
+          f"({result['reruns_per_s']:.1f} reruns/s)")
+    print(f"{'step':<18} {'count':>6} {'service':>9} {'mean':>9} " + " ".join(f"{f'p{q}':>9}" for q in PERCENTILES))
+    for step, stats in result["latency"].items():
+        print(f"{step:<18} {stats['count']:>6} {stats['service_mean_s'] * 1000:7.1f}ms {stats['mean_s'] * 1000:7.1f}ms "
+              + " ".join(f"{stats[f'p{q}_s'] * 1000:7.1f}ms" for q in PERCENTILES))
+    print(f"RSS {result['rss_before_mib']:.1f} -> {result['rss_after_mib']:.1f} MiB, "
+          f"{result['rss_per_session_kib']:.1f} KiB per session held")
+    print(f"Session state {result['session_state_bytes']:.0f} bytes per session: "
+          + ", ".join(f"{key} {size:.0f}" for key, size in list(result["session_state_bytes_by_key"].items())[:6]))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"benchmark": "loadtest", "results": result}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
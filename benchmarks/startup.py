@@ -0,0 +1,93 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "main.py")
+
+PAGES = ["Cover Page", "Data Collection", "Generate Report", "Portfolio Dashboard", "Portfolio Comparison"]
+
+# Modules whose import is worth reporting when a page pulls them in
+HEAVY_MODULES = ["numpy", "pandas", "pyarrow", "matplotlib", "matplotlib.pyplot", "seaborn", "openpyxl", "sqlite3"]
+
+
+# Resident set size of this process in MiB
+def current_rss_mb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+# Runs in a fresh interpreter: time the first render of one page on a cold process
+def measure_page(page):
+    started = time.perf_counter()
+    from streamlit.testing.v1 import AppTest
+    streamlit_import_s = time.perf_counter() - started
+
+    baseline_modules = set(sys.modules)
+    baseline_rss = current_rss_mb()
+    started = time.perf_counter()
+    at = AppTest.from_file(APP_PATH, default_timeout=120)
+    at.session_state["page"] = page
+    at.run()
+    first_render_s = time.perf_counter() - started
+    loaded = set(sys.modules) - baseline_modules
+
+    return {
+        "page": page,
+        "streamlit_import_s": round(streamlit_import_s, 4),
+        "first_render_s": round(first_render_s, 4),
+        "rss_before_mb": round(baseline_rss, 1),
+        "rss_after_mb": round(current_rss_mb(), 1),
+        "modules_loaded": len(loaded),
+        "heavy_modules_loaded": [module for module in HEAVY_MODULES if module in loaded],
+        "exceptions": [exception.message for exception in at.exception],
+    }
+
+
+def run(pages, repeat):
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        env = dict(os.environ, KBDSS_DB_PATH=os.path.join(directory, "startup.db"))
+        for page in pages:
+            for _ in range(repeat):
+                output = subprocess.run([sys.executable, __file__, "--child", page], env=env, check=True,
+                                        capture_output=True, text=True).stdout
+                results.append(json.loads(output.strip().splitlines()[-1]))
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure cold-start render time, RSS and imports of each page.")
+    parser.add_argument("--pages", nargs="+", default=PAGES, help="pages to measure (default: all)")
+    parser.add_argument("--repeat", type=int, default=1, help="fresh processes per page")
+    parser.add_argument("-o", "--output", help="write the results to this JSON file")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        print(json.dumps(measure_page(args.child)))
+        return
+
+    results = run(args.pages, args.repeat)
+    for result in results:
+        print(f"{result['page']:<22} first render {result['first_render_s']:7.3f}s  "
+              f"RSS {result['rss_before_mb']:6.1f} -> {result['rss_after_mb']:6.1f} MiB  "
+              f"heavy imports: {', '.join(result['heavy_modules_loaded']) or '-'}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"benchmark": "startup", "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
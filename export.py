@@ -0,0 +1,219 @@
+import hashlib
+import html
+import json
+import multiprocessing
+import os
+import textwrap
+import threading
+import zipfile
+from base64 import b64encode
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+import numpy as np
+
+import radar
+
+REPORT_TITLE = "Circularity Propensity Report"
+
+FORMATS = {
+    "html": ("text/html", "html"),
+    "pdf": ("application/pdf", "pdf"),
+    "xlsx": ("application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "xlsx"),
+}
+
+# Number of finished (or running) exports kept per process, least recently used evicted first
+EXPORT_CACHE_SIZE = 512
+
+# Workers for single reports that someone is waiting for
+INTERACTIVE_WORKERS = 2
+
+# Niceness added to the batch export workers, so bulk exports yield the CPU to interactive sessions
+BATCH_NICENESS = 10
+
+
+# Plain-data description of one report, the only thing sent to the export workers.
+# averages and levels are indexed like the knowledge base categories and DMFs (NaN = unanswered).
+def report_data(kb, project, averages, ci, levels):
+    action_plans = []
+    for dmf_id, level in enumerate(levels):
+        if np.isnan(level):
+            action_plans.append((kb.dmf_names[dmf_id].strip(), "Not answered", "N/A"))
+        else:
+            level = int(round(level))
+            action_plans.append((kb.dmf_names[dmf_id].strip(), level, kb.action_plan(dmf_id, level)))
+    return {
+        "project": project,
+        "kb_version": kb.version,
+        "averages": [(category, round(float(value), 4)) for category, value in zip(kb.categories, averages)
+                     if not np.isnan(value)],
+        "ci": round(float(ci), 4),
+        "action_plans": action_plans,
+    }
+
+
+# Hash of the report content, used as the export cache key
+def report_hash(report):
+    return hashlib.sha256(json.dumps(report, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def _radar_png(report, dpi=100):
+    categories = [category for category, _ in report["averages"]]
+    return radar.render_radar(categories, [value for _, value in report["averages"]], dpi=dpi)
+
+
+def to_html(report):
+    rows = "".join(f"<tr><td>{html.escape(category)}</td><td>{value:.3f}</td></tr>"
+                   for category, value in report["averages"])
+    plans = "".join(f"<tr><td>{html.escape(dmf)}</td><td>{html.escape(str(level))}</td><td>{html.escape(plan)}</td></tr>"
+                    for dmf, level, plan in report["action_plans"])
+    image = b64encode(_radar_png(report)).decode("ascii")
+    return f"""<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>{REPORT_TITLE} - {html.escape(report['project'])}</title>
+<style>
+body {{ font-family: sans-serif; color: #333333; max-width: 960px; margin: auto; }}
+h1, h2 {{ color: #3333cc; text-align: center; }}
+table {{ border-collapse: collapse; width: 100%; margin: 10px 0px; }}
+td, th {{ border: 1px solid #4a4a4a; padding: 6px; color: #004d00; vertical-align: top; }}
+</style></head><body>
+<h1>{REPORT_TITLE}</h1>
+<p>Project: {html.escape(report['project'])} (knowledge base v{html.escape(report['kb_version'])})</p>
+<h2>Category averages</h2>
+<table><tr><th>Category</th><th>Average Value</th></tr>{rows}
+<tr><th>Circularity Index (CI)</th><th>{report['ci']:.3f}</th></tr></table>
+<h2>Circular Economy Integration Levels Radar Chart</h2>
+<p style="text-align: center"><img alt="Radar chart" src="data:image/png;base64,{image}"></p>
+<h2>Action plans</h2>
+<table><tr><th>DMF</th><th>Response</th><th>Action Plan</th></tr>{plans}</table>
+</body></html>
+""".encode("utf-8")
+
+
+def to_pdf(report):
+    from matplotlib.backends.backend_pdf import PdfPages
+    from matplotlib.figure import Figure
+    from matplotlib.image import imread
+
+    buffer = BytesIO()
+    with PdfPages(buffer) as pdf:
+        # Page 1: averages, CI and radar chart (A4 portrait)
+        fig = Figure(figsize=(8.27, 11.69))
+        fig.suptitle(f"{REPORT_TITLE}\n{report['project']}", color="#3333cc", fontweight="bold")
+        ax = fig.add_axes([0.1, 0.62, 0.8, 0.25])
+        ax.axis("off")
+        cells = [[category, f"{value:.3f}"] for category, value in report["averages"]]
+        cells.append(["Circularity Index (CI)", f"{report['ci']:.3f}"])
+        ax.table(cellText=cells, colLabels=["Category", "Average Value"], loc="center", cellLoc="left")
+        ax = fig.add_axes([0.15, 0.05, 0.7, 0.55])
+        ax.axis("off")
+        ax.imshow(imread(BytesIO(_radar_png(report)), format="png"))
+        pdf.savefig(fig)
+        fig.clear()
+
+        # Following pages: the action plan table, wrapped to fit the page
+        rows_per_page = 8
+        plans = report["action_plans"]
+        for start in range(0, len(plans), rows_per_page):
+            fig = Figure(figsize=(8.27, 11.69))
+            ax = fig.add_axes([0.05, 0.05, 0.9, 0.9])
+            ax.axis("off")
+            cells = [[textwrap.fill(dmf, 25), str(level), textwrap.fill(plan, 70)]
+                     for dmf, level, plan in plans[start:start + rows_per_page]]
+            table = ax.table(cellText=cells, colLabels=["DMF", "Response", "Action Plan"], loc="upper center",
+                             cellLoc="left", colWidths=[0.27, 0.1, 0.63])
+            table.auto_set_font_size(False)
+            table.set_fontsize(7)
+            for (row, _), cell in table.get_celld().items():
+                cell.set_height(0.1 if row else 0.03)
+            pdf.savefig(fig)
+            fig.clear()
+    return buffer.getvalue()
+
+
+def to_xlsx(report):
+    import pandas as pd
+    from openpyxl.drawing.image import Image
+
+    buffer = BytesIO()
+    with pd.ExcelWriter(buffer, engine="openpyxl") as writer:
+        summary = pd.DataFrame(report["averages"] + [("Circularity Index (CI)", report["ci"])],
+                               columns=["Category", "Average Value"])
+        summary.to_excel(writer, sheet_name="Summary", index=False)
+        pd.DataFrame(report["action_plans"], columns=["DMF", "Response", "Action Plan"]).to_excel(
+            writer, sheet_name="Action Plans", index=False)
+        sheet = writer.sheets["Summary"]
+        sheet.column_dimensions["A"].width = 40
+        sheet.column_dimensions["B"].width = 15
+        sheet.add_image(Image(BytesIO(_radar_png(report))), "D2")
+        writer.sheets["Action Plans"].column_dimensions["A"].width = 45
+        writer.sheets["Action Plans"].column_dimensions["C"].width = 120
+    return buffer.getvalue()
+
+
+_RENDERERS = {"html": to_html, "pdf": to_pdf, "xlsx": to_xlsx}
+
+
+def render(report, fmt):
+    return _RENDERERS[fmt](report)
+
+
+# ZIP archive of finished batch exports, see ReportExporter.submit_batch
+def zip_archive(files):
+    buffer = BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, future in files:
+            archive.writestr(name, future.result())
+    return buffer.getvalue()
+
+
+def _lower_priority():
+    if hasattr(os, "nice"):
+        os.nice(BATCH_NICENESS)
+
+
+# Runs exports in pools of worker processes and keeps the results by report hash, so a report
+# that was exported once is served from memory. Batch exports (ZIP archives of many reports) have
+# their own lower-priority pool, so they never queue ahead of a single report someone is waiting for.
+class ReportExporter:
+    def __init__(self, max_workers=INTERACTIVE_WORKERS, batch_workers=None, cache_size=EXPORT_CACHE_SIZE):
+        context = multiprocessing.get_context("spawn")
+        self._pool = ProcessPoolExecutor(max_workers=max_workers, mp_context=context)
+        self._batch_pool = ProcessPoolExecutor(max_workers=batch_workers, mp_context=context,
+                                               initializer=_lower_priority)
+        # (hash, format) -> (future, submitted by a batch)
+        self._cache = OrderedDict()
+        self._cache_size = cache_size
+        self._lock = threading.Lock()
+
+    # Future of the exported file bytes
+    def submit(self, report, fmt, batch=False):
+        key = (report_hash(report), fmt)
+        with self._lock:
+            future, from_batch = self._cache.get(key, (None, False))
+            # A failed export is retried, and an interactive request does not wait behind a batch job
+            # that has not started yet
+            reusable = future is not None and not (future.done() and future.exception() is not None) \
+                and (batch or not from_batch or future.running() or future.done())
+            if reusable:
+                self._cache.move_to_end(key)
+                return future
+            future = (self._batch_pool if batch else self._pool).submit(render, report, fmt)
+            self._cache[key] = (future, batch)
+            self._cache.move_to_end(key)
+            if len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+            return future
+
+    # Exports of many reports by the batch workers, as (file name in the archive, future) pairs.
+    # Nothing waits on them here; zip_archive bundles them once they are all done.
+    def submit_batch(self, reports, fmt):
+        files = []
+        for index, report in enumerate(reports, start=1):
+            name = "".join(c if c.isalnum() or c in "-_" else "_" for c in report["project"]) or "project"
+            files.append((f"{index:03d}_{name}.{FORMATS[fmt][1]}", self.submit(report, fmt, batch=True)))
+        return files
+
+    def shutdown(self):
+        self._pool.shutdown(cancel_futures=True)
+        self._batch_pool.shutdown(cancel_futures=True)
@@ -0,0 +1,152 @@
+import cProfile
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+
+# Metrics are collected only when KBDSS_METRICS is set. Disabled, span() hands back one shared
+# no-op context manager, so an instrumented call costs a global lookup and a function call.
+ENABLED = os.environ.get("KBDSS_METRICS", "") not in ("", "0")
+
+# Prometheus text exposition file, rewritten at most every METRICS_WRITE_INTERVAL seconds
+METRICS_FILE = os.environ.get("KBDSS_METRICS_FILE")
+METRICS_WRITE_INTERVAL = 5.0
+
+# Directory for single-rerun profiles (cProfile .prof plus folded stacks for flame graphs)
+PROFILE_DIR = os.environ.get("KBDSS_PROFILE_DIR")
+
+# Interval between stack samples while profiling a rerun
+SAMPLE_INTERVAL = 0.005
+
+_NULL_SPAN = nullcontext()
+_lock = threading.Lock()
+# span name -> [count, total seconds, max seconds]
+_spans = {}
+_counters = Counter()
+_last_write = 0.0
+
+
+def span(name):
+    if not ENABLED:
+        return _NULL_SPAN
+    return _timed_span(name)
+
+
+@contextmanager
+def _timed_span(name):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        with _lock:
+            stats = _spans.get(name)
+            if stats is None:
+                _spans[name] = [1, elapsed, elapsed]
+            else:
+                stats[0] += 1
+                stats[1] += elapsed
+                stats[2] = max(stats[2], elapsed)
+
+
+def increment(counter, amount=1):
+    if ENABLED:
+        with _lock:
+            _counters[counter] += amount
+
+
+# Resident set size of the process in bytes (peak RSS where the current value is unavailable)
+def rss_bytes():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+# Copy of the collected spans and counters
+def snapshot():
+    with _lock:
+        return {name: tuple(stats) for name, stats in _spans.items()}, dict(_counters)
+
+
+def prometheus_text():
+    spans, counters = snapshot()
+    lines = [
+        "# HELP kbdss_span_seconds Time spent in instrumented sections of the app.",
+        "# TYPE kbdss_span_seconds summary",
+    ]
+    for name, (count, total, _) in sorted(spans.items()):
+        lines.append(f'kbdss_span_seconds_count{{span="{name}"}} {count}')
+        lines.append(f'kbdss_span_seconds_sum{{span="{name}"}} {total:.6f}')
+    lines += ["# HELP kbdss_span_max_seconds Slowest run of each instrumented section.",
+              "# TYPE kbdss_span_max_seconds gauge"]
+    lines += [f'kbdss_span_max_seconds{{span="{name}"}} {stats[2]:.6f}' for name, stats in sorted(spans.items())]
+    for name, value in sorted(counters.items()):
+        lines += [f"# TYPE kbdss_{name}_total counter", f"kbdss_{name}_total {value}"]
+    lines += ["# HELP kbdss_process_resident_memory_bytes Resident memory of the app process.",
+              "# TYPE kbdss_process_resident_memory_bytes gauge",
+              f"kbdss_process_resident_memory_bytes {rss_bytes()}"]
+    return "\n".join(lines) + "\n"
+
+
+# Rewrite the metrics file if it is due; the rename keeps scrapers from reading a partial file
+def write_metrics_file(force=False):
+    global _last_write
+    if not ENABLED or not METRICS_FILE:
+        return
+    now = time.monotonic()
+    if not force and now - _last_write < METRICS_WRITE_INTERVAL:
+        return
+    _last_write = now
+    temporary = f"{METRICS_FILE}.{os.getpid()}.tmp"
+    with open(temporary, "w") as f:
+        f.write(prometheus_text())
+    os.replace(temporary, METRICS_FILE)
+
+
+def _frame_stack(frame):
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(stack))
+
+
+# Profile everything run inside the block on the current thread. Writes <name>.prof (cProfile) and
+# <name>.folded, stack samples in the folded format of flamegraph.pl, speedscope and py-spy's raw output.
+@contextmanager
+def profile_rerun(name, directory=PROFILE_DIR):
+    os.makedirs(directory, exist_ok=True)
+    thread_id = threading.get_ident()
+    samples = Counter()
+    done = threading.Event()
+
+    def sample():
+        while not done.wait(SAMPLE_INTERVAL):
+            frame = sys._current_frames().get(thread_id)
+            if frame is not None:
+                samples[_frame_stack(frame)] += 1
+
+    sampler = threading.Thread(target=sample, name="kbdss-stack-sampler", daemon=True)
+    profiler = cProfile.Profile()
+    sampler.start()
+    profiler.enable()
+    try:
+        yield os.path.join(directory, name)
+    finally:
+        profiler.disable()
+        done.set()
+        sampler.join()
+        profiler.dump_stats(os.path.join(directory, f"{name}.prof"))
+        with open(os.path.join(directory, f"{name}.folded"), "w") as f:
+            for stack, count in samples.most_common():
+                f.write(f"{stack} {count}\n")
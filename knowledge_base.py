@@ -0,0 +1,133 @@
+import json
+import os
+import sys
+from functools import lru_cache
+
+import numpy as np
+
+# Versioned knowledge base shipped with the app: categories, their CI weights, DMFs and action plans
+KNOWLEDGE_BASE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "knowledge_base.json")
+
+NO_ACTION_PLAN = "No action plan available for this response level."
+
+
+# Compiled form of the knowledge base. DMFs are addressed by integer id (their position in the
+# survey), categories by index, and the action plans by a flat (DMF x level) table.
+class KnowledgeBase:
+    def __init__(self, version, levels, categories, category_weights, category_explanations,
+                 category_offsets, dmf_codes, dmf_names, plans, effort):
+        self.version = version
+        self.levels = levels
+        self.categories = categories
+        self.category_weights = category_weights
+        self.category_explanations = category_explanations
+        # DMFs of category c are dmf ids category_offsets[c] .. category_offsets[c + 1] - 1
+        self.category_offsets = category_offsets
+        self.dmf_codes = dmf_codes
+        self.dmf_names = dmf_names
+        self.dmf_category = np.repeat(np.arange(len(categories), dtype=np.int8), np.diff(category_offsets))
+        # Action plan for DMF d at level l is plans[d * levels + l - 1] (None where missing)
+        self.plans = plans
+        # Effort of raising DMF d from level l to l + 1 is effort[d, l - 1]
+        self.effort = effort
+        self._index = {}
+        for dmf_id, (code, name) in enumerate(zip(dmf_codes, dmf_names)):
+            self._index[code.lower()] = dmf_id
+            self._index[name.strip().lower()] = dmf_id
+
+    @property
+    def dmf_count(self):
+        return len(self.dmf_codes)
+
+    # DMF ids belonging to a category
+    def category_dmfs(self, category):
+        return range(self.category_offsets[category], self.category_offsets[category + 1])
+
+    # Integer DMF id for a DMF code or display name, or None if unknown
+    def dmf_id(self, key):
+        return self._index.get(str(key).strip().lower())
+
+    def action_plan(self, dmf_id, level):
+        if not 1 <= level <= self.levels:
+            return NO_ACTION_PLAN
+        plan = self.plans[dmf_id * self.levels + level - 1]
+        return plan if plan is not None else NO_ACTION_PLAN
+
+
+# Build the compiled structure from the parsed JSON document
+def compile_knowledge_base(document):
+    levels = int(document["levels"])
+    default_effort = _effort(document.get("default_effort", [1] * (levels - 1)), levels, "default_effort")
+    categories, weights, explanations = [], [], []
+    offsets = [0]
+    dmf_codes, dmf_names, plans, effort = [], [], [], []
+
+    for category in document["categories"]:
+        categories.append(category["name"])
+        weights.append(float(category["weight"]))
+        explanations.append(category.get("explanation", "No explanation provided."))
+        for dmf in category["dmfs"]:
+            if dmf["id"] in dmf_codes:
+                raise ValueError(f"Duplicate DMF id {dmf['id']!r} in knowledge base")
+            dmf_codes.append(dmf["id"])
+            dmf_names.append(dmf["name"])
+            dmf_plans = [None] * levels
+            for level, plan in dmf.get("action_plans", {}).items():
+                level = int(level)
+                if not 1 <= level <= levels:
+                    raise ValueError(f"{dmf['id']}: action plan for level {level} is outside 1-{levels}")
+                dmf_plans[level - 1] = plan
+            plans.extend(dmf_plans)
+            effort.append(_effort(dmf["effort"], levels, dmf["id"]) if "effort" in dmf else default_effort)
+        offsets.append(len(dmf_codes))
+
+    return KnowledgeBase(
+        version=document["version"],
+        levels=levels,
+        categories=tuple(categories),
+        category_weights=np.array(weights),
+        category_explanations=tuple(explanations),
+        category_offsets=np.array(offsets, dtype=np.int16),
+        dmf_codes=tuple(dmf_codes),
+        dmf_names=tuple(dmf_names),
+        plans=tuple(plans),
+        effort=np.array(effort, dtype=np.int32).reshape(len(dmf_codes), levels - 1),
+    )
+
+
+# Effort of each level step, one non-negative integer per step from level 1 upwards
+def _effort(steps, levels, owner):
+    if len(steps) != levels - 1 or any(int(step) != step or step < 0 for step in steps):
+        raise ValueError(f"{owner}: effort must list {levels - 1} non-negative integers, got {steps!r}")
+    return [int(step) for step in steps]
+
+
+# Load and compile a knowledge base file; the default file is compiled once per process
+@lru_cache(maxsize=None)
+def load_knowledge_base(path=KNOWLEDGE_BASE_PATH):
+    with open(path, encoding="utf-8") as f:
+        return compile_knowledge_base(json.load(f))
+
+
+# List the gaps in a knowledge base, e.g. response levels that have no action plan
+def validate(kb):
+    gaps = []
+    for category in range(len(kb.categories)):
+        if len(kb.category_dmfs(category)) == 0:
+            gaps.append(f"Category {kb.categories[category]!r} has no DMFs")
+    for dmf_id in range(kb.dmf_count):
+        missing = [level for level in range(1, kb.levels + 1)
+                   if kb.plans[dmf_id * kb.levels + level - 1] is None]
+        if missing:
+            gaps.append(f"{kb.dmf_codes[dmf_id]} ({kb.dmf_names[dmf_id].strip()}): "
+                        f"no action plan for level(s) {', '.join(map(str, missing))}")
+    return gaps
+
+
+if __name__ == "__main__":
+    kb = load_knowledge_base(sys.argv[1] if len(sys.argv) > 1 else KNOWLEDGE_BASE_PATH)
+    gaps = validate(kb)
+    print(f"Knowledge base v{kb.version}: {len(kb.categories)} categories, {kb.dmf_count} DMFs, {len(gaps)} gap(s)")
+    for gap in gaps:
+        print(f"  - {gap}")
+    sys.exit(1 if gaps else 0)
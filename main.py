@@ -1,9 +1,17 @@
+import logging
+import os
+import time
+import uuid
+from contextlib import nullcontext
+
 import streamlit as st
-import pandas as pd
-import numpy as np
-import matplotlib.pyplot as plt
-from math import pi
-import seaborn as sns
+
+import instrumentation
+
+# Cover image shown on the cover page, read once per server process
+COVER_IMAGE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'kbdss_photos', 'kbdss1.jpg')
+
+logger = logging.getLogger(__name__)
 
 # Function to display the cover page
 def cover_page():
@@ -17,135 +25,6 @@ def cover_page():
         - Your responses will help in understanding the current trends and challenges in implementing circular economy practices in the construction sector.
     """)
 
-# Define action plans for each DMF and level of agreement
-action_plans = {
-    "DMF1": {
-        1: "Review material procurement processes for minor improvements, such as reducing packaging waste, increasing recycled content, and avoiding over-ordering.",
-        2: "Develop sustainable supplier partnerships, such as engaging with suppliers on their environmental performance, sourcing locally and ethically, and promoting circularity in the supply chain.",
-        3: "Implement a comprehensive sustainable material procurement policy, such as setting clear targets and criteria for material selection, monitoring and reporting on material use and impacts, and adopting circular procurement practices such as leasing, sharing, and remanufacturing."
-    },
-    "DMF2": {
-        1: "Encourage worker feedback on site waste management, such as soliciting suggestions for waste reduction, reuse, and recycling, and rewarding good practices.",
-        2: "Train teams in advanced CE practices, such as providing education and awareness on CE principles and benefits, developing skills and competencies for CE implementation, and fostering a culture of innovation and collaboration.",
-        3: "Establish guidelines for minimizing waste during construction, such as applying lean construction methods, optimizing design and prefabrication, and implementing waste hierarchy and circularity principles."
-    },
-    
-    "DMF6": {
-        1: "Implement basic pollution control measures, such as complying with environmental standards and regulations, using appropriate personal protective equipment and waste management facilities, and minimizing noise and dust emissions.",
-        2: "Adopt green site practices and materials, such as reducing energy and water consumption, using renewable and low-carbon sources, and selecting eco-friendly and biodegradable materials.",
-        3: "Develop a robust plan to minimize environmental impact, such as conducting a life cycle assessment, setting and monitoring environmental indicators and targets, and implementing mitigation and compensation measures."
-    },
-    "DMF7": {
-        1: "Encourage use of eco-friendly materials in small projects, such as experimenting with alternative and innovative materials, testing their performance and feasibility, and evaluating their environmental and economic benefits.",
-        2: "Implement green construction techniques broadly, such as using natural and renewable materials, applying passive design and biophilic principles, and enhancing biodiversity and ecosystem services.",
-        3: "Institutionalize eco-friendly construction practices across all projects, such as establishing a green building certification system, creating incentives and rewards for green construction, and promoting green building standards and guidelines."
-    },
-    
-    "DMF8": {
-        1: "Conduct audits to identify resource inefficiencies, such as measuring and analyzing resource consumption and waste generation, identifying areas for improvement, and benchmarking against industry best practices.",
-        2: "Optimize resource use in specific project areas, such as implementing resource-saving measures, applying resource-efficient technologies and processes, and achieving resource productivity and performance goals.",
-        3: "Implement circularity and resource efficiency in all operations, such as adopting a circular business model, creating closed-loop systems and cycles, and maximizing resource value and utilization."
-    },
-   
-    "DMF10": {
-        1: "Assess ecological footprints in select projects, such as calculating and reporting the environmental impacts of the projects, identifying the main drivers and contributors of the impacts, and comparing the results with industry averages and benchmarks.",
-        2: "Expand ecological footprint assessments to more projects, such as applying a consistent and comprehensive methodology, covering all project phases and aspects, and using the results for decision making and improvement.",
-        3: "Integrate ecological footprint reduction in strategic planning, such as setting and communicating ecological footprint reduction targets and indicators, implementing and monitoring ecological footprint reduction measures and actions, and evaluating and reporting the progress and achievements."
-    },
-    "DMF11": {
-        1: "Ensure basic compliance with CE-related policies, such as understanding and following the relevant laws and regulations, meeting the minimum requirements and standards, and avoiding penalties and sanctions.",
-        2: "Engage with policymakers on CE requirements, such as providing feedback and suggestions, participating in consultations and dialogues, and advocating for favorable and supportive policies.",
-        3: "Lead industry efforts in shaping and exceeding CE regulations, such as collaborating with policymakers and other stakeholders, setting and promoting best practices and voluntary commitments, and influencing and inspiring others to adopt CE."
-    },
-   
-    "DMF14": {
-        1: "Align some business strategies with CE principles, such as incorporating CE aspects into the vision and mission statements, identifying CE opportunities and challenges, and aligning CE with the core competencies and values.",
-        2: "Develop CE-driven business and regulatory models, such as designing products and services for circularity, creating value propositions and revenue streams based on CE, and complying with CE-related policies and regulations.",
-        3: "Fully integrate CE into business strategy and comply with regulations, such as embedding CE into the strategic objectives and goals, implementing and monitoring CE performance and outcomes, and achieving competitive advantage and leadership in CE."
-    },
-   
-    "DMF16": {
-        1: "Explore circular business models in pilot projects, such as testing and validating different circular business models, evaluating their feasibility and viability, and learning from the results and feedback.",
-        2: "Develop and test circular business models, such as selecting and scaling up the most promising circular business models, refining and improving their design and delivery, and measuring and reporting their impacts and benefits.",
-        3: "Fully integrate circular business models into company operations, such as adopting circular business models as the main or dominant mode of operation, creating a circular value proposition and customer base, and achieving circularity and profitability."
-    },
-    "DMF17": {
-        1: "Initiate discussions on CE with key suppliers, such as identifying and contacting the most relevant and influential suppliers, sharing information and expectations on CE, and exploring possibilities and opportunities for collaboration.",
-        2: "Develop supply chain partnerships for CE, such as establishing formal and long-term agreements and contracts with suppliers, co-creating and co-delivering CE solutions and value, and monitoring and evaluating the performance and outcomes of the partnerships.",
-        3: "Fully integrate CE into the entire supply chain, such as extending CE principles and practices to all suppliers and subcontractors, creating a circular supply chain network and system, and maximizing the efficiency and effectiveness of the supply chain."
-    },
-   
-    "DMF19": {
-        1: "Introduce CE principles in some organizational processes, raising awareness among staff and integrating CE aspects into existing processes and functions.",
-        2: "Expand the use of CE principles in major decisions, developing CE criteria for decision making and involving CE experts in the decision-making process.",
-        3: "Embed CE principles across all organizational levels and processes, establishing a clear vision for CE and aligning all organizational processes with CE principles."
-    },
-    "DMF20": {
-        1: "Provide basic CE training to the workforce, introducing the concept of CE and providing examples and case studies to enhance basic knowledge and awareness.",
-        2: "Develop an advanced training program for CE skills, addressing CE skill gaps and designing a tailored training program to improve CE competencies.",
-        3: "Establish a continuous learning culture for CE across the organization, supporting a learning environment for CE and encouraging the development of CE skills."
-    },
-    "DMF21": {
-        1: "Encourage basic interest in CE among project leaders, informing and inspiring them about the value of CE and empowering them to explore CE initiatives.",
-        2: "Develop specific CE goals for project managers and engineers, setting CE performance expectations and providing support for achieving these goals.",
-        3: "Ensure strong commitment and active engagement in CE from all project leaders, involving them in CE strategy and fostering a sense of ownership for CE initiatives."
-    },
-    "DMF22": {
-        1: "Provide introductory knowledge of CE strategies, explaining main CE strategies and highlighting their benefits to staff.",
-        2: "Conduct workshops on various CE strategies, offering hands-on exercises and practical examples of applying CE strategies.",
-        3: "Ensure deep understanding and application of diverse CE strategies, assessing and enhancing CE strategy knowledge and encouraging the use of diverse CE strategies in different contexts."
-    },
-   
-    "DMF23": {
-        1: "Promote general openness to CE adoption, inspiring staff about the potential of CE and empowering them to explore CE adoption.",
-        2: "Cultivate a strong willingness to adopt CE practices, developing CE adoption criteria and involving staff in the CE adoption process.",
-        3: "Create a culture of enthusiasm and readiness for CE adoption, establishing a clear vision for CE adoption and aligning organizational processes with CE adoption."
-    },
-   
-    "DMF24": {
-        1: "Encourage regular team communication on CE topics, providing communication channels for CE topics and soliciting team feedback.",
-        2: "Enhance collaboration on CE initiatives, facilitating collaborative CE initiatives and involving team members in CE initiative design.",
-        3: "Establish industry-leading practices in CE communication and collaboration, creating a system for CE communication and embedding CE practices in the industry."
-    },
-    "DMF26": {
-        1: "Introduce the use of basic CE tools, explaining main CE tools and highlighting their benefits.",
-        2: "Develop proficiency in specific CE tools and metrics, addressing CE tool gaps and designing a tailored training program.",
-        3: "Achieve expert-level proficiency in a range of CE tools and performance metrics, updating CE tool knowledge regularly and facilitating advanced use of CE tools."
-    },
-    "DMF27": {
-        1: "Encourage the use of modular elements in small projects, experimenting with modular components and evaluating their benefits.",
-        2: "Train teams in advanced modular design techniques, addressing modular design skill gaps and designing a comprehensive training program.",
-        3: "Fully integrate modular design and ease of disassembly in all projects, setting ambitious modular design targets and achieving high modular design goals."
-    },
-    "DMF28": {
-        1: "Start using eco-friendly and biodegradable materials in select projects, experimenting with alternative materials and evaluating their benefits.",
-        2: "Expand the use of eco-design principles and materials, applying passive design principles and enhancing biodiversity.",
-        3: "Fully integrate eco-design and biodegradable materials in all products, establishing a comprehensive eco-design policy and creating a culture of eco-design."
-    },
-   
-    "DMF29": {
-        1: "Ensure basic product information is available for maintenance, collecting product information and making it accessible for maintenance staff.",
-        2: "Develop comprehensive databases for product information and data, organizing product information in a structured way and providing detailed data on product performance.",
-        3: "Lead in the industry in providing complete product lifecycle information, updating product information regularly and facilitating advanced access to product data."
-    },
-    "DMF30": {
-        1: "Implement basic practices for material recovery and repair, segregating waste materials and inspecting and repairing products.",
-        2: "Develop advanced systems for material recovery and reparability, using digital tools for material tracking and investing in technology for efficient repair.",
-        3: "Set industry standards in material recovery and product reparability, collaborating with recovery and repair companies and achieving high recovery and reparability rates."
-    },
-    "DMF31": {
-        1: "Assess the cost implications of basic CE integration, estimating costs and benefits of CE integration and managing financial resources.",
-        2: "Conduct detailed analyses of lifecycle costs and CE integration, measuring lifecycle costs and benefits and using the results for decision making.",
-        3: "Develop industry-leading practices in managing costs of CE integration, implementing a cost management model for CE integration and optimizing cost performance."
-    },
-    "DMF32": {
-        1: "Define the scope of circular design in initial projects, introducing circular design concepts and defining expected outcomes for initial projects.",
-        2: "Clarify and expand the circular design scope in major projects, reviewing initial projects to improve circular design for major projects.",
-        3: "Set clear, comprehensive circular design objectives across all projects, establishing a vision for circular design and aligning project processes with circular design objectives."
-    }
-} 
-
-
 # Function to display the cover page
 def cover_page():
     st.title("Automated Knowledge-Based Decision Support System(KBDSS) for Project Circularity")
@@ -159,7 +38,7 @@ def cover_page():
         and also provide you with automated action plan based on your project circularity index. The KBDSS involves the computation of CE suitability index based on the DMFs in 
         5 categories(phase of integration, environmental consideration,organisational attributes,project team capacity and project feature and circular design)""")
   
-    st.image('kbdss_photos/kbdss1.jpg', caption='KBDSS flow') 
+    st.image(cover_image(), caption='KBDSS flow')
     
     st.markdown("""
         **How was it developed:**   
@@ -183,78 +62,285 @@ def cover_page():
 
     """)
 
-# Define action plans for each DMF and level of agreement, now categorized and named according to the provided file
-action_plans = {
-    "Phase of Integration": {
-        "Material Procurement Processes": action_plans["DMF1"],
-        "Construction stage site waste management ": action_plans["DMF2"]
-    },
-    "Environmental Consideration": {
-        "Pollution and Environmental Impact": action_plans["DMF6"],
-        "Eco-Friendly Construction Practices": action_plans["DMF7"],
-        "Resource Efficiency and Circularity": action_plans["DMF8"],
-        "Ecological Footprints and Natural Capital": action_plans["DMF10"],
-        "Policy & Regulation": action_plans["DMF11"]
-    },
-    "Organizational Attributes": {
-        "Business Strategy and CE Compliance": action_plans["DMF14"],
-        "Available Circular Business Model": action_plans["DMF16"],
-        "Supply Chain Integration": action_plans["DMF17"],
-        "Firm Use of CE Principles": action_plans["DMF19"],
-        "Availability of Skilled and Experienced Workforce": action_plans["DMF20"]
-    },
-    "Project Team Capacity for CE": {
-        "Project Managers' and Site Engineers’ Interest in CE": action_plans["DMF21"],
-        "Project Team Understanding of Various CE Strategies": action_plans["DMF22"],
-        "Willingness and Readiness of Project Team to Adopt CE": action_plans["DMF23"],
-        "Communication and Collaboration Among Team": action_plans["DMF24"],
-        "Project Team’s Proficiency in CE Tools and Performance Metrics": action_plans["DMF26"]
-    },
-    "Product Feature and Circular Design": {
-        "Modular Design and Ease of Disassembly/Deconstruction": action_plans["DMF27"],
-        "Eco-Design and Biodegradable Materials": action_plans["DMF28"],
-        "Availability of Product Information and Data": action_plans["DMF29"],
-        "Material Recovery and Reparability": action_plans["DMF30"],
-        "Cost Implications of CE Integration and Lifecycle Cost Analysis": action_plans["DMF31"],
-        "Circular Design Scope Clarity": action_plans["DMF32"]
-    }
-}
+
+@st.cache_resource
+def cover_image():
+    with open(COVER_IMAGE_PATH, 'rb') as f:
+        return f.read()
+
+
+# Knowledge base compiled once per server process and shared across sessions
+@st.cache_resource
+def get_knowledge_base():
+    import knowledge_base
+
+    kb = knowledge_base.load_knowledge_base()
+    for gap in knowledge_base.validate(kb):
+        logger.warning("Knowledge base v%s gap: %s", kb.version, gap)
+    return kb
+
+
+# Response database shared by all sessions; its writer thread batches submissions
+@st.cache_resource
+def get_response_store():
+    import storage
+
+    return storage.ResponseStore(storage.DB_PATH)
+
+LEVEL_OPTIONS = ["Select", 1, 2, 3, 4, 5]
+
+# Seconds between checks for report files that are still being exported
+EXPORT_POLL_INTERVAL = 1.0
+
+
+# Record one answer and keep the answered count up to date without rescanning all DMFs
+def record_answer(dmf_id, response):
+    answers = st.session_state['answers']
+    was_answered = bool(answers[dmf_id])
+    level = 0 if response == "Select" else response
+    answers[dmf_id] = level
+    st.session_state['answered_dmf_count'] += (level != 0) - was_answered
+
+
+# Callback of a single selectbox. The selectbox already shows the new answer, so only the survey
+# progress is redrawn instead of rerunning the whole page.
+def save_answer(dmf_id, key):
+    record_answer(dmf_id, st.session_state[key])
+    st.rerun("survey_progress")
+
+
+# Progress of the survey, a fragment that the answer callbacks rerun on its own
+@st.fragment(key="survey_progress")
+def survey_progress(total_dmf_count):
+    answered = st.session_state['answered_dmf_count']
+    st.progress(answered / total_dmf_count,
+                text=f"{answered} of {total_dmf_count} DMFs answered, "
+                     f"{st.session_state['reruns'] - st.session_state['survey_started_at_rerun']} page reruns so far")
+
+
+# Callback of the survey form's "Generate Report" button: every answer arrives with the submission
+def submit_survey_form():
+    for dmf_id in range(get_knowledge_base().dmf_count):
+        record_answer(dmf_id, st.session_state[f"dmf_{dmf_id}"])
+    submit_survey()
+
+
+# Callback of the "Generate Report" button: store the responses and move to the report page.
+# An empty survey is refused; a respondent who submits again replaces their earlier submission.
+def submit_survey():
+    if not st.session_state['answers'].any():
+        st.session_state['survey_warning'] = "Answer at least one DMF before generating the report."
+        return
+    st.session_state['responses'] = st.session_state['answers'].copy()  # Store responses in session state
+    st.session_state['responses_project'] = st.session_state['project']
+    kb = get_knowledge_base()
+    get_response_store().submit(st.session_state['respondent_id'], st.session_state['responses_project'],
+                                kb.version, st.session_state['responses'])
+    # Reruns since the survey was first shown, including the one this submission triggers
+    survey_reruns = st.session_state['reruns'] + 1 - st.session_state.pop('survey_started_at_rerun')
+    st.session_state['survey_reruns'] = survey_reruns
+    logger.info("Survey completed after %d reruns", survey_reruns)
+    st.session_state['page'] = "Generate Report"
+
 
 # Function to display the survey form and collect responses
 def data_collection():
+    import numpy as np
+
     st.header("Data Collection")
-    total_dmf_count = sum(len(dmfs) for dmfs in action_plans.values())
-    answered_dmf_count = 0  # Initialize answered DMF count
-
-    responses = {}  # Dictionary to store user responses
-
-    # Define brief explanations for each category
-    category_explanations = {
-        "Phase of Integration": "This categroy refers to the point in a construction project where CE principles are actively incorporated.This include production, construction, use, end of life and beyond system boundary phases.You are expected to rate the phases in construction project where CE decision making is very crucial.Kindly select your level of agreement from 1 to 5, where 1 indicates strong disagreement and 5 indicates strong agreement using a 5 point likert scale",
-        "Environmental Consideration": "This category emphasizes eco-friendly practices, resource efficiency, and regulatory compliance. You are expected to rate the DMFs within this category based on your level of agreement from 1 to 5, where 1 indicates strong disagreement and 5 indicates strong agreement using a 5 point likert scale ",
-        "Organizational Attributes": "This section addresses how business strategies, models, and supply chain integration can align with circular economy principles.You are expected to rate the DMFs within this category based on your level of agreement from 1 to 5, where 1 indicates strong disagreement and 5 indicates strong agreement using a 5 point likert scale",
-        "Project Team Capacity for CE": "This category evaluates the project team's interest, understanding, and proficiency in circular economy strategies and tools.You are expected to rate the DMFs within this category based on your level of agreement from 1 to 5, where 1 indicates strong disagreement and 5 indicates strong agreement using a 5 point likert scale",
-        "Product Feature and Circular Design": "Here, the focus is on product design aspects such as modularity, eco-design, and material recovery, aiming for sustainability and circularity.You are expected to rate the DMFs within this category based on your level of agreement from 1 to 5, where 1 indicates strong disagreement and 5 indicates strong agreement using a 5 point likert scale"
-    }
+    kb = get_knowledge_base()
+    total_dmf_count = kb.dmf_count
+
+    # Answers are kept as one small integer per DMF, indexed by DMF id (0 = unanswered), rather than a
+    # dict keyed by display names: a few dozen bytes per session instead of a few kilobytes
+    if 'answers' not in st.session_state:
+        st.session_state['answers'] = np.zeros(total_dmf_count, dtype=np.int8)
+    st.session_state.setdefault('answered_dmf_count', 0)
+    st.session_state.setdefault('survey_started_at_rerun', st.session_state['reruns'])
+    st.session_state.setdefault('respondent_id', uuid.uuid4().hex)
+    answers = st.session_state['answers']
+
+    st.text_input("Project name", value=st.session_state.get('responses_project', "Unnamed project"), key='project')
+
+    # By default every answer is recorded as it is given and only the progress bar is redrawn. In form
+    # mode the whole survey is one form: changing a selectbox runs nothing at all, and all answers are
+    # sent together by "Generate Report", so none can be left unsaved, but there is no progress bar.
+    form_mode = st.toggle("Send all answers at once with Generate Report", value=False, key='form_mode')
+
+    container = st.form(key="survey") if form_mode else st.container()
+    with container:
+        for category, category_name in enumerate(kb.categories):
+            st.subheader(category_name)
+            # Display the brief explanation for the category
+            st.markdown(kb.category_explanations[category])
+
+            for dmf_id in kb.category_dmfs(category):
+                dmf_name = kb.dmf_names[dmf_id]
+                key = f"dmf_{dmf_id}"
+                label = f"{dmf_name} - Select your level of agreement"
+                if form_mode:
+                    st.selectbox(label, options=LEVEL_OPTIONS, index=int(answers[dmf_id]), key=key)
+                else:
+                    st.selectbox(label, options=LEVEL_OPTIONS, index=int(answers[dmf_id]), key=key,
+                                 on_change=save_answer, args=(dmf_id, key))
+
+        if form_mode:
+            st.form_submit_button("Generate Report", on_click=submit_survey_form)
+
+    if 'survey_warning' in st.session_state:
+        st.warning(st.session_state.pop('survey_warning'))
+
+    if not form_mode:
+        # The answered count is maintained by the answer callbacks
+        survey_progress(total_dmf_count)
+        st.button("Generate Report", on_click=submit_survey)
+
+
+# Monte Carlo draws of the CI, cached per response matrix and category weights
+@st.cache_data(max_entries=64)
+def ci_draws(matrix, weights, n_draws=100_000):
+    import uncertainty
+
+    return uncertainty.monte_carlo_ci(matrix, weights, n_draws=n_draws, seed=0)
+
+
+# Confidence interval of the CI and a tornado ranking of the DMFs
+def uncertainty_section(kb, vector, CI, weights):
+    import pandas as pd
+
+    import uncertainty
+
+    # Respondents of the same project are resampled when there are several; otherwise only the
+    # category weights are perturbed
+    matrix = vector[None, :]
+    project = st.session_state.get('responses_project')
+    if project:
+        _, _, project_matrix = get_response_store().load_responses(kb.dmf_count, project)
+        if len(project_matrix) > 1:
+            matrix = project_matrix
+
+    draws = ci_draws(matrix, weights)
+    low, high = uncertainty.confidence_interval(draws)
+    if len(matrix) > 1:
+        # The interval is around the project's pooled CI, not around this respondent's own CI
+        st.markdown(f"**Project CI: {uncertainty.pooled_ci(matrix, weights):.3f}**, pooling the answers of the "
+                    f"{len(matrix)} respondents of project {project!r}; 95% interval {low:.3f} to {high:.3f} "
+                    f"({len(draws):,} draws). Your own CI is {CI:.3f}.")
+    else:
+        st.markdown(f"**Circularity Index (CI): {CI:.3f}**, 95% interval {low:.3f} to {high:.3f} "
+                    f"under category weight uncertainty ({len(draws):,} draws).")
+
+    # CI change when each DMF moves one level down or up
+    st.caption("Change of your CI when a single DMF moves one level down or up:")
+    down, up = uncertainty.sensitivity(vector, weights)
+    order = uncertainty.tornado_order(down, up)
+    tornado_df = pd.DataFrame({"One level down": down[order], "One level up": up[order]},
+                              index=[kb.dmf_names[dmf_id].strip() for dmf_id in order])
+    st.bar_chart(tornado_df, horizontal=True, stack=True)
+    timed_table("sensitivity", tornado_df)
+
+
+# Worker pool shared by all sessions that renders report files off the script thread
+@st.cache_resource
+def get_report_exporter():
+    import export
+
+    return export.ReportExporter()
+
+
+# Download buttons for the HTML, PDF and XLSX versions of a report
+def export_section(report, file_name):
+    import export
+
+    if not st.toggle("Prepare downloadable report files", key='prepare_exports'):
+        return
+    exporter = get_report_exporter()
+    futures = {fmt: exporter.submit(report, fmt) for fmt in export.FORMATS}
+    polling = not all(future.done() for future in futures.values())
+    st.fragment(export_buttons, run_every=EXPORT_POLL_INTERVAL if polling else None)(futures, file_name, polling)
+
+
+# Buttons of the finished report files. While some are still being prepared, this fragment reruns on
+# its own every EXPORT_POLL_INTERVAL seconds instead of the script thread waiting on the workers.
+def export_buttons(futures, file_name, polling):
+    import export
+
+    columns = st.columns(len(futures))
+    for column, (fmt, future) in zip(columns, futures.items()):
+        mime, extension = export.FORMATS[fmt]
+        if not future.done():
+            column.caption(f"Preparing {fmt.upper()}...")
+        elif future.exception() is not None:
+            column.error(f"The {fmt.upper()} export failed.")
+        else:
+            column.download_button(f"Download {fmt.upper()}", future.result(), file_name=f"{file_name}.{extension}",
+                                   mime=mime, key=f"download_{fmt}")
+    # Once everything is ready, rerun the page once so the fragment stops polling
+    if polling and all(future.done() for future in futures.values()):
+        st.rerun()
+
+
+# Prioritized action plan: the cheapest DMF upgrades that reach a target CI
+def improvement_plan_section(kb, vector, CI, weights):
+    import pandas as pd
+
+    import planner
+
+    st.markdown("<div class='report-title'>Improvement Plan</div>", unsafe_allow_html=True)
+    max_ci = float(weights.sum() * kb.levels)
+    target = st.number_input("Target Circularity Index (CI)", min_value=0.0, max_value=max_ci,
+                             value=min(round(float(CI) + 0.5, 1), max_ci), step=0.1, key='target_ci')
+
+    steps = planner.plan_upgrades(vector, target, kb.effort, weights)
+    if steps is None:
+        st.warning("The target cannot be reached by raising the answered DMFs.")
+        return
+    if not steps:
+        st.success("The current Circularity Index already meets the target.")
+        return
+
+    plan_data = []
+    reached = float(CI)
+    for priority, (dmf_id, from_level, to_level, effort, gain) in enumerate(steps, start=1):
+        reached += gain
+        plan_data.append({"Priority": priority, "DMF": kb.dmf_names[dmf_id], "From": from_level, "To": to_level,
+                          "Effort": effort, "CI after step": round(reached, 3),
+                          "Action Plan": kb.action_plan(dmf_id, from_level)})
+    st.markdown(f"Total effort {sum(step[3] for step in steps)} to raise the CI from {CI:.3f} to {reached:.3f}.")
+    timed_table("improvement_plan", pd.DataFrame(plan_data).set_index("Priority"))
 
-    for category, dmfs in action_plans.items():
-        st.subheader(category)
-        # Display the brief explanation for the category
-        st.markdown(category_explanations.get(category, "No explanation provided."))
-        
-        for dmf_name, levels in dmfs.items():
-            response = st.selectbox(f"{dmf_name} - Select your level of agreement", options=["Select", 1, 2, 3, 4, 5], key=dmf_name)
-            if response != "Select":
-                responses[dmf_name] = response
-                answered_dmf_count += 1  # Increment count for each answered DMF
 
-    # Update progress after responses have been collected
-    progress = answered_dmf_count / total_dmf_count
-    st.progress(progress)
+# Weight set of a project, from the weight set registry (re-read when the file changes)
+def project_weight_set(project):
+    import weighting
 
-    if st.button("Generate Report"):
-        st.session_state['responses'] = responses  # Store responses in session state
-        st.experimental_rerun()  # Rerun the app to move to the report page
+    return weighting.load_registry().for_project(project)
+
+
+# Report tables of one set of answers, built once for every session that gave the same answers, so
+# viewing the report again does not rebuild the DataFrames. Keyed by the raw answer and category
+# average bytes and the CI. Each call gets its own copy, so no session can change another's tables.
+@st.cache_data(max_entries=1024)
+def report_tables(levels_key, averages_key, CI):
+    import numpy as np
+    import pandas as pd
+
+    kb = get_knowledge_base()
+    levels = np.frombuffer(levels_key, dtype=np.int8)
+    averages = np.frombuffer(averages_key)
+    answered = ~np.isnan(averages)
+
+    averages_df = pd.DataFrame({'Average Value': averages[answered]},
+                               index=[category for category, shown in zip(kb.categories, answered) if shown])
+    averages_df.loc['Circularity Index (CI)'] = CI
+
+    # Retrieve the action plan for each response, defaulting to a message if the response level isn't covered
+    report_df = pd.DataFrame({
+        "DMF": kb.dmf_names,
+        "Response": [str(level) if level else "Not answered" for level in levels.tolist()],
+        "Action Plan": [kb.action_plan(dmf_id, level) if level else "N/A" for dmf_id, level in enumerate(levels.tolist())],
+    })
+    return averages_df, report_df
 
 
 # Function to generate and display the report based on user responses
@@ -284,12 +370,21 @@ def generate_report():
     </style>
     """, unsafe_allow_html=True)
 
-    responses = st.session_state.get('responses', {})
+    kb = get_knowledge_base()
+    responses = st.session_state.get('responses')
 
-    if not responses:
+    if responses is None or not responses.any():
         st.error("No responses found. Please complete the survey form first.")
         return
 
+    import export
+    import radar
+    import scoring
+
+    if 'survey_reruns' in st.session_state:
+        survey_reruns = st.session_state['survey_reruns']
+        st.caption(f"The survey was completed in {survey_reruns} rerun{'s' if survey_reruns != 1 else ''}.")
+
     # Report Introduction Section with colored font
     st.markdown("""
     <div class="report-section">
@@ -297,97 +392,247 @@ def generate_report():
     </div>
     """, unsafe_allow_html=True)
 
-    # Calculate average values for each category
-    category_averages = {}
-    for category, dmfs in action_plans.items():
-        category_responses = [responses[dmf_name] for dmf_name in dmfs.keys() if dmf_name in responses]
-        if category_responses:
-            category_averages[category] = np.mean(category_responses)
+    project = st.session_state.get('responses_project', "Unnamed project")
+    weight_set = project_weight_set(project)
+    vector = scoring.levels_to_vector(responses)
 
-       # Calculate the Circularity Index (CI)
-    CI = (category_averages.get("Phase of Integration", 0) * 0.199 +
-          category_averages.get("Environmental Consideration", 0) * 0.199 +
-          category_averages.get("Organizational Attributes", 0) * 0.199 +
-          category_averages.get("Project Team Capacity for CE", 0) * 0.200 +
-          category_averages.get("Product Feature and Circular Design", 0) * 0.204)
+    # Calculate average values for each category and the Circularity Index (CI)
+    with instrumentation.span("category_averages"):
+        averages = scoring.category_averages(vector)[0]
+    with instrumentation.span("circularity_index"):
+        CI = float(scoring.circularity_index(averages, weight_set.weights))
+    averages_df, report_df = report_tables(responses.tobytes(), averages.tobytes(), CI)
 
     # Display the averages and CI in a table
-    averages_df = pd.DataFrame.from_dict(category_averages, orient='index', columns=['Average Value'])
-    averages_df.loc['Circularity Index (CI)'] = CI
-    st.table(averages_df)
+    timed_table("averages", averages_df)
+    if weight_set.expert_consistency:
+        experts = len(weight_set.expert_consistency)
+        st.caption(f"CI weights: {weight_set.key}, derived from {experts - len(weight_set.excluded_experts)} of "
+                   f"{experts} experts (consistency ratio {weight_set.consistency_ratio:.3f}).")
+    else:
+        st.caption(f"CI weights: {weight_set.key}.")
 
- 
+    if st.toggle("Show uncertainty and sensitivity of the CI", key='show_uncertainty'):
+        uncertainty_section(kb, vector, CI, weight_set.weights)
 
     # Radar Chart Visualization Section
     st.markdown("<div class='report-section'>", unsafe_allow_html=True)
     st.markdown("<div class='report-title'>Circular Economy Integration Levels Radar Chart</div>", unsafe_allow_html=True)
 
 
-    # Create a DataFrame for the radar chart
-    categories = list(category_averages.keys())
-    N = len(categories)
-
-    # Compute the angle for each category
-    angles = [n / float(N) * 2 * pi for n in range(N)]
-    angles += angles[:1]  # Completing the circle by adding the first angle at the end
-
-    # Initialize the radar chart
-    fig, ax = plt.subplots(figsize=(6, 6), subplot_kw=dict(polar=True))
-
-    # Draw one axe per category + add labels
-    plt.xticks(angles[:-1], categories, color='grey', size=10)
+    # Render the radar chart (memoized on the rounded category averages)
+    with instrumentation.span("radar_render"):
+        radar_png = radar.render_radar(list(averages_df.index[:-1]), averages_df['Average Value'].iloc[:-1])
+    st.image(radar_png, width=600)
+    st.markdown("</div>", unsafe_allow_html=True)
 
-    # Draw ylabels
-    ax.set_rlabel_position(0)
-    plt.yticks([1,2,3,4,5], ["1","2","3","4","5"], color="grey", size=7)
-    plt.ylim(0,5)
 
-    # Plot data
-    values = list(category_averages.values())
-    values += values[:1]  # Completing the circle
-    ax.plot(angles, values, linewidth=1, linestyle='solid', label="Average Agreement")
+    improvement_plan_section(kb, vector, CI, weight_set.weights)
 
-    # Fill area
-    ax.fill(angles, values, 'b', alpha=0.1)
+    # Display the DataFrame as a table in Streamlit
+    with st.expander("Action plans for every DMF at its current level"):
+        timed_table("action_plans", report_df)
 
-    
-    st.pyplot(fig)
-    st.markdown("</div>", unsafe_allow_html=True)
+    report = export.report_data(kb, project, averages, CI, vector)
+    export_section(report, "circularity_report")
 
 
-    
-    report_data = []
+# Function to display statistics over all stored responses, read from the running aggregates
+def portfolio_dashboard():
+    import pandas as pd
 
-    for category, dmfs in action_plans.items():
-        for dmf_name, levels in dmfs.items():
-            response = responses.get(dmf_name)
-            if response:
-                # Retrieve the action plan for the given response, defaulting to a message if the response level isn't covered
-                action_plan = levels.get(response, "No action plan available for this response level.")
-                report_data.append({"DMF": dmf_name, "Response": response, "Action Plan": action_plan})
-            else:
-                report_data.append({"DMF": dmf_name, "Response": "Not answered", "Action Plan": "N/A"})
+    import weighting
 
+    st.title("Portfolio Dashboard")
+    kb = get_knowledge_base()
+    store = get_response_store()
 
+    project = st.selectbox("Project", options=["All projects"] + store.projects())
+    # Each project's CI uses its own weight set, as on the report and comparison pages
+    summary = store.portfolio_summary(kb.dmf_count, len(kb.categories), None if project == "All projects" else project,
+                                      weighting.load_registry().weights_for_projects)
+    if summary["respondents"] == 0:
+        st.info("No responses have been stored yet.")
+        return
 
-    # Convert the report data into a pandas DataFrame
-    report_df = pd.DataFrame(report_data)
+    st.metric("Respondents", summary["respondents"])
+    st.metric("Mean Circularity Index (CI)", f"{summary['ci_mean']:.3f}",
+              help=f"Variance {summary['ci_variance']:.3f}")
+
+    st.subheader("Categories")
+    timed_table("dashboard_categories", pd.DataFrame({
+        "Respondents": summary["category_n"],
+        "Mean": summary["category_mean"],
+        "Variance": summary["category_variance"],
+    }, index=list(kb.categories)))
+
+    st.subheader("Decision-making factors")
+    dmf_df = pd.DataFrame(summary["dmf_level_counts"], index=[name.strip() for name in kb.dmf_names],
+                          columns=[f"Level {level}" for level in range(1, 6)])
+    dmf_df.insert(0, "Answers", summary["dmf_n"])
+    dmf_df["Mean"] = summary["dmf_mean"]
+    dmf_df["Variance"] = summary["dmf_variance"]
+    st.dataframe(dmf_df)
+
+    st.subheader("Circularity Index trend")
+    trend_df = pd.DataFrame(summary["ci_trend"], columns=["Project", "Day", "Respondents", "Mean CI"])
+    trend_df["Day"] = pd.to_datetime(trend_df["Day"], unit="D")
+    st.line_chart(trend_df.pivot(index="Day", columns="Project", values="Mean CI"))
+
+
+# Process pool shared by all sessions for rendering portfolio charts off the script thread
+@st.cache_resource
+def get_render_pool():
+    import portfolio
+
+    return portfolio.make_render_pool()
+
+
+# Small-multiple radar charts, cached per (rounded) matrix of project averages
+@st.cache_data(max_entries=16)
+def portfolio_radars(categories, averages):
+    import portfolio
+
+    return portfolio.render_radars(get_render_pool(), categories, averages)
+
+
+# Function to compare the CI and category averages of many projects
+def portfolio_comparison():
+    import numpy as np
+    import pandas as pd
+
+    import export
+    import portfolio
+    import radar
+    import scoring
+    import weighting
+
+    st.title("Portfolio Comparison")
+    kb = get_knowledge_base()
+
+    uploaded = st.file_uploader("Responses file (CSV with a 'project' column and one column per DMF)",
+                                type=["csv"])
+    if uploaded is not None:
+        responses_df = pd.read_csv(uploaded)
+        if "project" not in responses_df.columns:
+            st.error("The file needs a 'project' column.")
+            return
+        projects, matrix = responses_df["project"].to_numpy(), scoring.responses_to_matrix(responses_df)
+        names, respondents, averages, _ = portfolio.project_scores(projects, matrix)
+        dmf_means = None
+    else:
+        # Scored from the per-project level histograms of the running aggregates, so the page does not
+        # read the stored answers and its cost does not grow with the number of submissions
+        st.caption("Comparing all stored responses. Upload a file to compare other projects.")
+        names, respondents, level_counts = get_response_store().project_levels(kb.dmf_count)
+        averages, dmf_means = portfolio.scores_from_level_counts(level_counts)
+    if len(names) == 0:
+        st.info("No responses to compare.")
+        return
 
-    # Display the DataFrame as a table in Streamlit
-    st.table(report_df)
+    # Each project is scored with its own weight set
+    ci = scoring.circularity_index(averages, weighting.load_registry().weights_for_projects(names))
+    order = portfolio.rank_projects(ci)
+
+    comparison_df = pd.DataFrame(averages[order], columns=list(kb.categories))
+    comparison_df.insert(0, "Project", [names[i] for i in order])
+    comparison_df.insert(1, "Respondents", respondents[order])
+    comparison_df["Circularity Index (CI)"] = ci[order]
+    comparison_df.index = pd.RangeIndex(1, len(order) + 1, name="Rank")
+    st.dataframe(comparison_df)
+
+    with st.spinner(f"Rendering {len(order)} radar charts"):
+        images = portfolio_radars(kb.categories, np.round(averages[order], radar.RADAR_DECIMALS))
+    columns = st.columns(4)
+    for rank, (project_index, image) in enumerate(zip(order, images)):
+        with columns[rank % 4]:
+            st.image(image, caption=f"{rank + 1}. {names[project_index]} (CI {ci[project_index]:.2f})")
+
+    # Reports of every project, rendered by the export workers and bundled in one ZIP file
+    st.subheader("Export project reports")
+    fmt = st.selectbox("Format", options=list(export.FORMATS), format_func=str.upper)
+    if st.button("Prepare ZIP of all project reports"):
+        if dmf_means is None:
+            dmf_means = portfolio.project_dmf_means(projects, matrix)
+        reports = [export.report_data(kb, names[i], averages[i], ci[i], dmf_means[i]) for i in order]
+        # Only the futures are kept in the session; the archive is built when it is downloaded
+        st.session_state['portfolio_export'] = (fmt, get_report_exporter().submit_batch(reports, fmt))
+    if 'portfolio_export' in st.session_state:
+        zip_fmt, files = st.session_state['portfolio_export']
+        polling = not all(future.done() for _, future in files)
+        st.fragment(zip_download, run_every=EXPORT_POLL_INTERVAL if polling else None)(zip_fmt, files, polling)
+
+
+# Progress of a batch export and, once every report is done, the download button of the ZIP archive.
+# Polls like export_buttons while the batch workers are busy.
+def zip_download(fmt, files, polling):
+    import export
+
+    done = sum(future.done() for _, future in files)
+    failed = sum(future.done() and future.exception() is not None for _, future in files)
+    if done < len(files):
+        st.progress(done / len(files), text=f"Exported {done} of {len(files)} reports...")
+    elif failed:
+        st.error(f"{failed} of {len(files)} exports failed. Prepare the ZIP again to retry them.")
+    else:
+        st.download_button(f"Download {fmt.upper()} reports (ZIP)", lambda: export.zip_archive(files),
+                           file_name=f"project_reports_{fmt}.zip", mime="application/zip")
+    if polling and done == len(files):
+        st.rerun()
+
+
+# st.table with its render time recorded as a span
+def timed_table(name, data):
+    with instrumentation.span(f"st.table.{name}"):
+        st.table(data)
+
+
+# Sidebar panel with the collected metrics, shown when KBDSS_ADMIN is set and metrics are enabled
+def admin_panel():
+    with st.sidebar.expander("Performance"):
+        spans, counters = instrumentation.snapshot()
+        st.caption(f"Process RSS {instrumentation.rss_bytes() / 2 ** 20:.1f} MiB, "
+                   + ", ".join(f"{name} {value}" for name, value in sorted(counters.items())))
+        st.table([{"Span": name, "Count": count, "Mean (ms)": round(1000 * total / count, 2),
+                   "Max (ms)": round(1000 * slowest, 2)} for name, (count, total, slowest) in sorted(spans.items())])
+        if instrumentation.PROFILE_DIR:
+            st.button("Profile this page", on_click=st.session_state.__setitem__, args=('profile_rerun', True),
+                      help=f"Profiles the next rerun into {instrumentation.PROFILE_DIR}")
 
 
 # Main app function
 def main():
+    # Count script reruns per session, used to measure reruns per completed survey
+    if 'reruns' not in st.session_state:
+        instrumentation.increment("sessions_started")
+    st.session_state['reruns'] = st.session_state.get('reruns', 0) + 1
+    instrumentation.increment("reruns")
+
     st.sidebar.title("Navigation")
-    page = st.sidebar.radio("Go to", ["Cover Page", "Data Collection", "Generate Report"])
-
-    if page == "Cover Page":
-        cover_page()
-    elif page == "Data Collection":
-        data_collection()
-    elif page == "Generate Report":
-        generate_report()
+    page = st.sidebar.radio("Go to", ["Cover Page", "Data Collection", "Generate Report",
+                                      "Portfolio Dashboard", "Portfolio Comparison"], key='page')
+
+    profiling = st.session_state.pop('profile_rerun', False) and instrumentation.PROFILE_DIR
+    profiler = nullcontext()
+    if profiling:
+        # A random suffix keeps profiles of sessions started in the same second apart
+        profiler = instrumentation.profile_rerun(f"rerun-{int(time.time())}-{uuid.uuid4().hex[:8]}")
+    with profiler, instrumentation.span(f"page.{page}"):
+        if page == "Cover Page":
+            cover_page()
+        elif page == "Data Collection":
+            data_collection()
+        elif page == "Generate Report":
+            generate_report()
+        elif page == "Portfolio Dashboard":
+            portfolio_dashboard()
+        elif page == "Portfolio Comparison":
+            portfolio_comparison()
+
+    if instrumentation.ENABLED:
+        if os.environ.get("KBDSS_ADMIN"):
+            admin_panel()
+        instrumentation.write_metrics_file()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,66 @@
+import numpy as np
+
+import scoring
+
+
+# CI gained by raising each DMF one level: its category weight divided by the number of answered
+# DMFs in that category. Unanswered DMFs are not part of any average and gain nothing.
+def marginal_gains(vector, weights=scoring.CATEGORY_WEIGHTS):
+    answered = ~np.isnan(np.asarray(vector, dtype=float))
+    answered_per_category = answered @ scoring.CATEGORY_MEMBERSHIP
+    with np.errstate(invalid="ignore", divide="ignore"):
+        category_gain = np.where(answered_per_category > 0, weights / answered_per_category, 0.0)
+    return np.where(answered, scoring.CATEGORY_MEMBERSHIP @ category_gain, 0.0)
+
+
+# Cheapest set of level upgrades that lifts the CI of one respondent to target_ci.
+# effort[d, l - 1] is the integer effort of raising DMF d from level l to l + 1. Each DMF can be
+# raised any number of levels up to the maximum, and the CI gain is linear in the levels gained,
+# so this is a multiple-choice knapsack solved by dynamic programming over the total effort.
+# Returns a list of (dmf_id, from_level, to_level, effort, gain) steps in priority order, or None
+# when the target cannot be reached.
+def plan_upgrades(vector, target_ci, effort, weights=scoring.CATEGORY_WEIGHTS, max_level=5):
+    vector = np.asarray(vector, dtype=float)
+    _, current = scoring.score(vector, weights)
+    needed = target_ci - current[0]
+    if needed <= 1e-9:
+        return []
+
+    gains = marginal_gains(vector, weights)
+    candidates = [d for d in np.flatnonzero(gains > 0) if vector[d] < max_level]
+    # Cumulative effort of raising each candidate by 0, 1, 2, ... levels
+    cumulative = {d: np.concatenate([[0], np.cumsum(effort[d, int(vector[d]) - 1:max_level - 1])])
+                  for d in candidates}
+    budget = int(sum(costs[-1] for costs in cumulative.values()))
+
+    # best[c] is the largest CI gain reachable with total effort at most c
+    best = np.zeros(budget + 1)
+    choices = []
+    for d in candidates:
+        options = np.full((len(cumulative[d]), budget + 1), -np.inf)
+        for raise_by, cost in enumerate(cumulative[d]):
+            options[raise_by, cost:] = best[:budget + 1 - cost] + gains[d] * raise_by
+        choice = options.argmax(axis=0)
+        best = options[choice, np.arange(budget + 1)]
+        choices.append(choice)
+
+    reachable = np.flatnonzero(best >= needed - 1e-9)
+    if len(reachable) == 0:
+        return None
+
+    # Walk the choices back from the cheapest reachable effort
+    c = int(reachable[0])
+    raises = {}
+    for d, choice in zip(reversed(candidates), reversed(choices)):
+        raises[d] = int(choice[c])
+        c -= int(cumulative[d][raises[d]])
+
+    steps = []
+    for d, raise_by in raises.items():
+        level = int(vector[d])
+        for step in range(raise_by):
+            steps.append((int(d), level + step, level + step + 1, int(effort[d, level + step - 1]), float(gains[d])))
+    # Best CI gain per unit of effort first, then put each DMF's own steps back in level order
+    order = sorted(steps, key=lambda s: (-s[4] / max(s[3], 1e-9), s[1], s[0]))
+    by_dmf = {d: iter(sorted(s for s in steps if s[0] == d)) for d in raises}
+    return [next(by_dmf[s[0]]) for s in order]
@@ -0,0 +1,81 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import radar
+import scoring
+
+# Resolution of the small-multiple radar charts
+THUMBNAIL_DPI = 60
+
+
+# Pooled category averages and CI of every project in one pass.
+# projects has one project name per row of the (respondents x DMF) matrix. Returns the project
+# names (sorted), respondents per project, (projects x category) averages and the CI per project.
+def project_scores(projects, matrix, weights=scoring.CATEGORY_WEIGHTS):
+    names, project_index = np.unique(np.asarray(projects, dtype=object).astype(str), return_inverse=True)
+    matrix = np.atleast_2d(np.asarray(matrix, dtype=float))
+    answered = ~np.isnan(matrix)
+    sums = np.where(answered, matrix, 0.0) @ scoring.CATEGORY_MEMBERSHIP
+    counts = answered @ scoring.CATEGORY_MEMBERSHIP
+
+    # Sum the respondents' category totals per project, one bincount per category
+    project_sums = np.column_stack([np.bincount(project_index, sums[:, c], minlength=len(names))
+                                    for c in range(sums.shape[1])])
+    project_counts = np.column_stack([np.bincount(project_index, counts[:, c], minlength=len(names))
+                                      for c in range(counts.shape[1])])
+    with np.errstate(invalid="ignore", divide="ignore"):
+        averages = project_sums / project_counts
+    respondents = np.bincount(project_index, minlength=len(names))
+    return list(names), respondents, averages, scoring.circularity_index(averages, weights)
+
+
+# Mean level of every DMF per project, as a (projects x DMF) matrix in the order of project_scores
+def project_dmf_means(projects, matrix):
+    names, project_index = np.unique(np.asarray(projects, dtype=object).astype(str), return_inverse=True)
+    matrix = np.atleast_2d(np.asarray(matrix, dtype=float))
+    answered = ~np.isnan(matrix)
+    totals = np.column_stack([np.bincount(project_index, np.where(answered[:, d], matrix[:, d], 0.0),
+                                          minlength=len(names)) for d in range(matrix.shape[1])])
+    counts = np.column_stack([np.bincount(project_index, answered[:, d], minlength=len(names))
+                              for d in range(matrix.shape[1])])
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return totals / counts
+
+
+# Pooled category averages and mean DMF levels per project from (projects x DMF x level) histograms,
+# as kept by the running aggregates. Matches project_scores and project_dmf_means on the same answers.
+def scores_from_level_counts(level_counts):
+    level_counts = np.asarray(level_counts, dtype=float)
+    dmf_totals = level_counts @ np.arange(1, level_counts.shape[-1] + 1)
+    dmf_counts = level_counts.sum(axis=-1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        averages = (dmf_totals @ scoring.CATEGORY_MEMBERSHIP) / (dmf_counts @ scoring.CATEGORY_MEMBERSHIP)
+        return averages, dmf_totals / dmf_counts
+
+
+# Project order by CI, highest first
+def rank_projects(ci):
+    return np.argsort(-np.asarray(ci), kind="stable")
+
+
+def _render_thumbnail(args):
+    categories, values, dpi = args
+    return radar.render_radar(categories, values, dpi=dpi)
+
+
+# Worker pool for chart rendering. Workers are spawned rather than forked, because the app process
+# runs several threads.
+def make_render_pool(max_workers=None):
+    return ProcessPoolExecutor(max_workers=max_workers or os.cpu_count(),
+                               mp_context=multiprocessing.get_context("spawn"))
+
+
+# Radar chart PNGs of every project, rendered in parallel across the pool's processes
+def render_radars(pool, categories, averages, dpi=THUMBNAIL_DPI):
+    categories = tuple(categories)
+    jobs = [(categories, tuple(np.nan_to_num(row, nan=0.0)), dpi) for row in np.asarray(averages)]
+    chunksize = max(1, len(jobs) // (4 * (os.cpu_count() or 1)))
+    return list(pool.map(_render_thumbnail, jobs, chunksize=chunksize))
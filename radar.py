@@ -0,0 +1,105 @@
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from io import BytesIO
+from math import pi
+
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from matplotlib.transforms import Bbox
+
+# Number of rendered charts kept in memory; least recently used ones are evicted first
+RADAR_CACHE_SIZE = 256
+
+# Category averages are rounded before rendering so near-identical score profiles share a cache entry
+RADAR_DECIMALS = 2
+
+# Number of chart templates (one per set of category labels) kept alive for reuse
+TEMPLATE_CACHE_SIZE = 8
+
+# The axes, ticks and labels only depend on the categories, so they are built once per set of
+# categories and each chart only replaces the plotted values. Templates are shared between
+# threads, so drawing holds a lock.
+_templates = OrderedDict()
+_template_lock = threading.Lock()
+
+
+# Radar chart of the category averages as PNG or SVG bytes
+def render_radar(categories, values, fmt="png", dpi=200):
+    values = tuple(round(float(value), RADAR_DECIMALS) for value in values)
+    return _render_radar(tuple(categories), values, fmt, dpi)
+
+
+def _build_template(categories):
+    N = len(categories)
+
+    # Compute the angle for each category
+    angles = [n / float(N) * 2 * pi for n in range(N)]
+    angles += angles[:1]  # Completing the circle by adding the first angle at the end
+
+    # The figure is built with the object-oriented API on its own Agg canvas, so it never
+    # enters pyplot's global figure registry
+    fig = Figure(figsize=(6, 6))
+    canvas = FigureCanvasAgg(fig)
+    ax = fig.add_subplot(polar=True)
+
+    # Draw one axe per category + add labels
+    ax.set_xticks(angles[:-1])
+    ax.set_xticklabels(categories, color='grey', size=10)
+
+    # Draw ylabels
+    ax.set_rlabel_position(0)
+    ax.set_yticks([1, 2, 3, 4, 5])
+    ax.set_yticklabels(["1", "2", "3", "4", "5"], color="grey", size=7)
+    ax.set_ylim(0, 5)
+
+    # Plot data (placeholder values, replaced for every chart)
+    values = [0.0] * (N + 1)
+    line, = ax.plot(angles, values, linewidth=1, linestyle='solid', label="Average Agreement")
+
+    # Fill area
+    fill, = ax.fill(angles, values, 'b', alpha=0.1)
+
+    # The layout does not depend on the values (they stay within the fixed 0-5 radius), so the
+    # tight bounding box is measured once instead of on every save
+    tight = fig.get_tightbbox(canvas.get_renderer())
+    bbox = Bbox.from_extents(tight.x0 - 0.1, tight.y0 - 0.1, tight.x1 + 0.1, tight.y1 + 0.1)
+    return fig, angles, line, fill, bbox
+
+
+def _release(template):
+    template[0].clear()
+
+
+@lru_cache(maxsize=RADAR_CACHE_SIZE)
+def _render_radar(categories, values, fmt, dpi):
+    with _template_lock:
+        template = _templates.get(categories)
+        if template is None:
+            template = _templates[categories] = _build_template(categories)
+            if len(_templates) > TEMPLATE_CACHE_SIZE:
+                _release(_templates.popitem(last=False)[1])
+        else:
+            _templates.move_to_end(categories)
+        fig, angles, line, fill, bbox = template
+
+        values = list(values)
+        values += values[:1]  # Completing the circle
+        line.set_ydata(values)
+        fill.set_xy(list(zip(angles, values)))
+
+        buffer = BytesIO()
+        fig.savefig(buffer, format=fmt, dpi=dpi, bbox_inches=bbox)
+        return buffer.getvalue()
+
+
+def cache_info():
+    return _render_radar.cache_info()
+
+
+# Drop the rendered charts and release the template figures
+def clear_cache():
+    _render_radar.cache_clear()
+    with _template_lock:
+        while _templates:
+            _release(_templates.popitem()[1])
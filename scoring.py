@@ -0,0 +1,119 @@
+import argparse
+import sys
+
+import numpy as np
+
+import knowledge_base
+
+KNOWLEDGE_BASE = knowledge_base.load_knowledge_base()
+
+# Weights applied to the category averages to compute the Circularity Index (CI)
+CATEGORY_WEIGHTS = KNOWLEDGE_BASE.category_weights
+
+CATEGORIES = list(KNOWLEDGE_BASE.categories)
+DMF_CODES = list(KNOWLEDGE_BASE.dmf_codes)
+DMF_NAMES = list(KNOWLEDGE_BASE.dmf_names)
+
+# (DMF x category) membership matrix, so that category sums are a single matrix product
+CATEGORY_MEMBERSHIP = np.eye(len(CATEGORIES))[KNOWLEDGE_BASE.dmf_category]
+
+
+# Convert a DMF-indexed array of integer levels (0 = unanswered), as kept in the session, into a DMF vector
+def levels_to_vector(levels):
+    levels = np.asarray(levels, dtype=float)
+    return np.where(levels > 0, levels, np.nan)
+
+
+# Turn a table of responses (one row per respondent) into a (respondents x DMF) matrix.
+# Levels outside 1-5 and non-numeric answers are treated as unanswered.
+def responses_to_matrix(frame):
+    import pandas as pd
+
+    matrix = np.full((len(frame), len(DMF_CODES)), np.nan)
+    for column in frame.columns:
+        index = KNOWLEDGE_BASE.dmf_id(column)
+        if index is not None:
+            matrix[:, index] = pd.to_numeric(frame[column], errors="coerce").to_numpy(dtype=float)
+    matrix[(matrix < 1) | (matrix > 5)] = np.nan
+    return matrix
+
+
+# NaN-aware average of each category for every respondent, as a (respondents x category) matrix.
+# A category with no answered DMF averages to NaN.
+def category_averages(matrix):
+    matrix = np.atleast_2d(np.asarray(matrix, dtype=float))
+    answered = ~np.isnan(matrix)
+    sums = np.where(answered, matrix, 0.0) @ CATEGORY_MEMBERSHIP
+    counts = answered @ CATEGORY_MEMBERSHIP
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return sums / counts
+
+
+# Weighted Circularity Index from category averages; unanswered categories contribute 0.
+# weights holds one weight per category, or one row of weights per respondent (per-project weight sets).
+def circularity_index(averages, weights=CATEGORY_WEIGHTS):
+    averages = np.nan_to_num(averages, nan=0.0)
+    weights = np.asarray(weights)
+    if weights.ndim == 2:
+        return np.einsum("ij,ij->i", averages, weights)
+    return averages @ weights
+
+
+# Category averages and CI for every respondent in one pass
+def score(matrix, weights=CATEGORY_WEIGHTS):
+    averages = category_averages(matrix)
+    return averages, circularity_index(averages, weights)
+
+
+def _read_table(path):
+    import pandas as pd
+
+    if str(path).lower().endswith((".parquet", ".pq")):
+        return pd.read_parquet(path)
+    return pd.read_csv(path)
+
+
+# Score a CSV/Parquet file of responses and return one row per respondent. The CI uses the given weight
+# set ("name" or "name@version") or, when the file has a 'project' column, the weight set of each project.
+def score_file(path, weight_set=None):
+    import weighting
+
+    frame = _read_table(path)
+    registry = weighting.load_registry()
+    if weight_set is not None:
+        weight_sets, index = [registry.get(weight_set)], np.zeros(len(frame), dtype=int)
+    elif "project" in frame.columns:
+        weight_sets, index = registry.project_weight_sets(frame["project"])
+    else:
+        weight_sets, index = [registry.default], np.zeros(len(frame), dtype=int)
+    weights = np.array([ws.weights for ws in weight_sets]).reshape(-1, len(CATEGORIES))[index]
+
+    averages, ci = score(responses_to_matrix(frame), weights)
+    id_columns = [c for c in frame.columns if KNOWLEDGE_BASE.dmf_id(c) is None]
+    result = frame[id_columns].copy()
+    for i, category in enumerate(CATEGORIES):
+        result[category] = averages[:, i]
+    result["Circularity Index (CI)"] = ci
+    result["Weight set"] = np.array([ws.key for ws in weight_sets], dtype=object)[index]
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compute category averages and the Circularity Index for a file of survey responses.")
+    parser.add_argument("input", help="CSV or Parquet file with one row per respondent and one column per DMF (code or display name)")
+    parser.add_argument("-o", "--output", help="write the scores to this CSV or Parquet file instead of stdout")
+    parser.add_argument("--weight-set", help="weight set (name or name@version) for every row, instead of the "
+                                             "weight set assigned to each project in the weight set registry")
+    args = parser.parse_args(argv)
+
+    result = score_file(args.input, args.weight_set)
+    if not args.output:
+        result.to_csv(sys.stdout, index=False)
+    elif args.output.lower().endswith((".parquet", ".pq")):
+        result.to_parquet(args.output, index=False)
+    else:
+        result.to_csv(args.output, index=False)
+
+
+if __name__ == "__main__":
+    main()
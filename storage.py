@@ -0,0 +1,232 @@
+import atexit
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+import analytics
+
+logger = logging.getLogger(__name__)
+
+# Location of the response database, overridable for deployments and benchmarks
+DB_PATH = os.environ.get(
+    "KBDSS_DB_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "kbdss_responses.db"))
+
+# One row per submitted survey and one row per answered DMF. DMF ids are the integer ids of the
+# knowledge base version recorded on the submission; levels are 1-5.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS projects (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS submissions (
+    id INTEGER PRIMARY KEY,
+    respondent TEXT NOT NULL,
+    project_id INTEGER NOT NULL REFERENCES projects(id),
+    kb_version TEXT NOT NULL,
+    submitted_at INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS submissions_project ON submissions(project_id);
+CREATE INDEX IF NOT EXISTS submissions_respondent ON submissions(respondent);
+CREATE TABLE IF NOT EXISTS responses (
+    submission_id INTEGER NOT NULL REFERENCES submissions(id),
+    dmf INTEGER NOT NULL,
+    level INTEGER NOT NULL,
+    PRIMARY KEY (submission_id, dmf)
+) WITHOUT ROWID;
+"""
+
+_STOP = object()
+
+
+# (submissions x DMF) matrix of levels from (submission id, dmf, level) rows, NaN where unanswered.
+# submission_ids must be sorted.
+def _levels_matrix(submission_ids, answers, dmf_count):
+    matrix = np.full((len(submission_ids), dmf_count), np.nan)
+    if answers:
+        answers = np.array(answers, dtype=np.int64)
+        matrix[np.searchsorted(submission_ids, answers[:, 0]), answers[:, 1]] = answers[:, 2]
+    return matrix
+
+
+def _connect(path):
+    connection = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    return connection
+
+
+# Response store backed by SQLite. Submissions are queued and written by a background thread in
+# batches, so a page that submits a survey never waits on the database. Each respondent has at most
+# one stored submission: submitting again replaces the earlier one.
+class ResponseStore:
+    def __init__(self, path=DB_PATH, batch_size=256, flush_interval=0.05):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue()
+        self._project_ids = {}
+
+        self._writer = _connect(path)
+        self._writer.executescript(SCHEMA + analytics.SCHEMA)
+        self._migrate_aggregates()
+        # Readers share one connection; WAL lets them run while the writer commits
+        self._reader = _connect(path)
+        self._read_lock = threading.Lock()
+
+        self._thread = threading.Thread(target=self._run, name="kbdss-response-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    # Queue one survey. levels is indexed by DMF id; 0 or NaN marks an unanswered DMF.
+    def submit(self, respondent, project, kb_version, levels, submitted_at=None):
+        levels = np.nan_to_num(np.asarray(levels, dtype=float), nan=0.0).astype(np.int8)
+        self._queue.put((respondent, project, kb_version, levels,
+                         int(submitted_at if submitted_at is not None else time.time())))
+
+    # Block until every queued submission has been written
+    def flush(self):
+        self._queue.join()
+
+    def close(self):
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join()
+            self._writer.close()
+            self._reader.close()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            # Collect whatever else arrives shortly after, up to batch_size
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size and batch[-1] is not _STOP:
+                try:
+                    batch.append(self._queue.get(timeout=max(deadline - time.monotonic(), 0)))
+                except queue.Empty:
+                    break
+            stop = batch[-1] is _STOP
+            submissions = batch[:-1] if stop else batch
+            try:
+                if submissions:
+                    self._write(submissions)
+            except Exception:
+                logger.exception("Failed to write %d survey submissions", len(submissions))
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+            if stop:
+                return
+
+    def _write(self, submissions):
+        # Within a batch, the last submission of a respondent wins
+        submissions = list({submission[0]: submission for submission in submissions}.values())
+        cursor = self._writer.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            self._remove_previous(cursor, [submission[0] for submission in submissions], len(submissions[0][3]))
+            project_ids = []
+            for respondent, project, kb_version, levels, submitted_at in submissions:
+                project_id = self._project_id(cursor, project)
+                project_ids.append(project_id)
+                cursor.execute(
+                    "INSERT INTO submissions (respondent, project_id, kb_version, submitted_at) VALUES (?, ?, ?, ?)",
+                    (respondent, project_id, kb_version, submitted_at))
+                submission_id = cursor.lastrowid
+                answered = np.flatnonzero(levels)
+                cursor.executemany(
+                    "INSERT INTO responses (submission_id, dmf, level) VALUES (?, ?, ?)",
+                    [(submission_id, int(dmf), int(levels[dmf])) for dmf in answered])
+            matrix = np.stack([submission[3] for submission in submissions]).astype(float)
+            matrix[matrix == 0] = np.nan
+            analytics.update_aggregates(cursor, project_ids, [submission[4] for submission in submissions], matrix)
+            cursor.execute("COMMIT")
+        except Exception:
+            cursor.execute("ROLLBACK")
+            self._project_ids.clear()
+            raise
+
+    # Delete the stored submissions of these respondents and take them out of the aggregates
+    def _remove_previous(self, cursor, respondents, dmf_count):
+        placeholders = ", ".join("?" * len(respondents))
+        previous = cursor.execute(
+            f"SELECT id, project_id, submitted_at FROM submissions WHERE respondent IN ({placeholders}) ORDER BY id",
+            respondents).fetchall()
+        if not previous:
+            return
+        previous = np.array(previous, dtype=np.int64)
+        ids = ", ".join(str(int(submission_id)) for submission_id in previous[:, 0])
+        answers = cursor.execute(f"SELECT submission_id, dmf, level FROM responses WHERE submission_id IN ({ids})").fetchall()
+        analytics.update_aggregates(cursor, previous[:, 1], previous[:, 2],
+                                    _levels_matrix(previous[:, 0], answers, dmf_count), sign=-1)
+        cursor.execute(f"DELETE FROM responses WHERE submission_id IN ({ids})")
+        cursor.execute(f"DELETE FROM submissions WHERE id IN ({ids})")
+
+    # Build the running aggregates for submissions stored before they existed
+    def _migrate_aggregates(self):
+        cursor = self._writer.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            if cursor.execute("PRAGMA user_version").fetchone()[0] < analytics.AGGREGATES_VERSION:
+                analytics.rebuild_aggregates(cursor)
+                cursor.execute(f"PRAGMA user_version = {analytics.AGGREGATES_VERSION}")
+            cursor.execute("COMMIT")
+        except Exception:
+            cursor.execute("ROLLBACK")
+            raise
+
+    def _project_id(self, cursor, project):
+        project_id = self._project_ids.get(project)
+        if project_id is None:
+            cursor.execute("INSERT OR IGNORE INTO projects (name) VALUES (?)", (project,))
+            project_id = cursor.execute("SELECT id FROM projects WHERE name = ?", (project,)).fetchone()[0]
+            self._project_ids[project] = project_id
+        return project_id
+
+    def _query(self, sql, parameters=()):
+        with self._read_lock:
+            return self._reader.execute(sql, parameters).fetchall()
+
+    # Query function whose queries all read one snapshot of the database, so that a batch committed
+    # by the writer in between cannot make their results disagree
+    @contextmanager
+    def _snapshot(self):
+        with self._read_lock:
+            self._reader.execute("BEGIN")
+            try:
+                yield lambda sql, parameters=(): self._reader.execute(sql, parameters).fetchall()
+            finally:
+                self._reader.execute("COMMIT")
+
+    def projects(self):
+        return [name for (name,) in self._query("SELECT name FROM projects ORDER BY name")]
+
+    # Stored submissions as (submission ids, project names, (submissions x DMF) matrix with NaN
+    # for unanswered DMFs), optionally limited to one project
+    def load_responses(self, dmf_count, project=None):
+        where, parameters = ("WHERE p.name = ?", (project,)) if project is not None else ("", ())
+        with self._snapshot() as query:
+            rows = query(
+                f"SELECT s.id, p.name FROM submissions s JOIN projects p ON p.id = s.project_id {where} ORDER BY s.id",
+                parameters)
+            answers = query(
+                f"SELECT r.submission_id, r.dmf, r.level FROM responses r JOIN submissions s ON s.id = r.submission_id "
+                f"JOIN projects p ON p.id = s.project_id {where}", parameters)
+
+        submission_ids = np.array([row[0] for row in rows], dtype=np.int64)
+        return submission_ids, [row[1] for row in rows], _levels_matrix(submission_ids, answers, dmf_count)
+
+    # Dashboard summary from the running aggregates; its cost does not grow with the number of submissions
+    def portfolio_summary(self, dmf_count, category_count, project=None, weights_for_projects=None):
+        with self._snapshot() as query:
+            return analytics.load_summary(query, dmf_count, category_count, project, weights_for_projects)
+
+    # Per-project DMF level histograms from the running aggregates, see analytics.load_project_levels
+    def project_levels(self, dmf_count):
+        with self._snapshot() as query:
+            return analytics.load_project_levels(query, dmf_count)
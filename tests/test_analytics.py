@@ -0,0 +1,93 @@
+import numpy as np
+import pytest
+
+import analytics
+import scoring
+import weighting
+from storage import ResponseStore
+
+DMF_COUNT = len(scoring.DMF_CODES)
+CATEGORY_COUNT = len(scoring.CATEGORIES)
+PROJECTS = ["Project A", "Project B", "Project C"]
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ResponseStore(str(tmp_path / "responses.db"))
+    yield store
+    store.close()
+
+
+@pytest.fixture
+def registry():
+    weights = np.array([0.4, 0.25, 0.15, 0.12, 0.08])
+    weight_set = weighting.derive_weight_set("panel", "1", scoring.CATEGORIES, [weights[:, None] / weights[None, :]])
+    return weighting.WeightRegistry(scoring.KNOWLEDGE_BASE, [weight_set], {"Project B": "panel"})
+
+
+# Submit random surveys, some respondents more than once, and return the submission day of the
+# stored (latest) submission of each respondent
+def fill(store, rng, submissions=120):
+    days = {}
+    for i in range(submissions):
+        respondent = f"r{rng.integers(60)}"
+        levels = rng.integers(0, 6, DMF_COUNT)
+        day = int(rng.integers(3))
+        store.submit(respondent, PROJECTS[rng.integers(len(PROJECTS))], "1", levels,
+                     submitted_at=day * analytics.SECONDS_PER_DAY + i)
+        days[respondent] = day
+        if i % 25 == 0:
+            store.flush()
+    store.flush()
+    return days
+
+
+def assert_summary_matches(summary, projects, days, matrix, weights):
+    averages, ci = scoring.score(matrix, weights)
+    assert summary["respondents"] == len(matrix)
+    assert summary["ci_mean"] == pytest.approx(ci.mean())
+    assert summary["ci_variance"] == pytest.approx(ci.var(), abs=1e-9)
+
+    answered = ~np.isnan(matrix)
+    np.testing.assert_array_equal(summary["dmf_n"], answered.sum(axis=0))
+    np.testing.assert_allclose(summary["dmf_mean"], np.nanmean(matrix, axis=0))
+    np.testing.assert_allclose(summary["dmf_variance"], np.nanvar(matrix, axis=0), atol=1e-9)
+    np.testing.assert_array_equal(summary["category_n"], (~np.isnan(averages)).sum(axis=0))
+    np.testing.assert_allclose(summary["category_mean"], np.nanmean(averages, axis=0))
+
+    expected_trend = {}
+    for project, day, value in zip(projects, days, ci):
+        n, total = expected_trend.get((project, day), (0, 0.0))
+        expected_trend[project, day] = (n + 1, total + value)
+    trend = {(project, day): (n, mean) for project, day, n, mean in summary["ci_trend"]}
+    assert trend.keys() == expected_trend.keys()
+    for key, (n, total) in expected_trend.items():
+        assert trend[key][0] == n
+        assert trend[key][1] == pytest.approx(total / n)
+
+
+def test_load_summary_matches_full_recompute(store, registry):
+    days = fill(store, np.random.default_rng(11))
+    _, projects, matrix = store.load_responses(DMF_COUNT)
+    respondent_days = [day for _, day in sorted(
+        (submission_id, days[respondent]) for submission_id, respondent in
+        store._query("SELECT id, respondent FROM submissions"))]
+
+    summary = store.portfolio_summary(DMF_COUNT, CATEGORY_COUNT, weights_for_projects=registry.weights_for_projects)
+    assert_summary_matches(summary, projects, respondent_days, matrix, registry.weights_for_projects(projects))
+
+
+def test_load_summary_of_one_project(store, registry):
+    fill(store, np.random.default_rng(5))
+    _, projects, matrix = store.load_responses(DMF_COUNT, "Project B")
+    summary = store.portfolio_summary(DMF_COUNT, CATEGORY_COUNT, "Project B", registry.weights_for_projects)
+    _, ci = scoring.score(matrix, registry.weights_for_projects(projects))
+    assert summary["respondents"] == len(matrix) > 0
+    assert summary["ci_mean"] == pytest.approx(ci.mean())
+    assert summary["ci_variance"] == pytest.approx(ci.var(), abs=1e-9)
+
+
+def test_load_summary_of_empty_store(store):
+    summary = store.portfolio_summary(DMF_COUNT, CATEGORY_COUNT)
+    assert summary["respondents"] == 0
+    assert summary["ci_trend"] == []
@@ -0,0 +1,64 @@
+import io
+import zipfile
+
+import numpy as np
+import pytest
+
+import export
+import scoring
+
+KB = scoring.KNOWLEDGE_BASE
+
+
+def make_report(project, seed):
+    levels = np.random.default_rng(seed).integers(1, 6, KB.dmf_count).astype(float)
+    levels[1] = np.nan
+    averages, ci = scoring.score(levels)
+    return export.report_data(KB, project, averages[0], ci[0], levels)
+
+
+@pytest.fixture(scope="module")
+def exporter():
+    exporter = export.ReportExporter(max_workers=1, batch_workers=1)
+    yield exporter
+    exporter.shutdown()
+
+
+def test_report_data_is_plain_and_hashable():
+    report = make_report("P & Q", 0)
+    assert report["action_plans"][1][1:] == ("Not answered", "N/A")
+    assert len(report["averages"]) == len(KB.categories)
+    assert export.report_hash(report) == export.report_hash(make_report("P & Q", 0))
+    assert export.report_hash(report) != export.report_hash(make_report("P & Q", 1))
+
+
+def test_render_formats():
+    report = make_report("P & Q", 0)
+    page = export.render(report, "html").decode("utf-8")
+    assert "P &amp; Q" in page and "data:image/png;base64," in page
+    assert f"{report['ci']:.3f}" in page
+    assert export.render(report, "pdf").startswith(b"%PDF")
+
+    import pandas as pd
+
+    summary = pd.read_excel(io.BytesIO(export.render(report, "xlsx")), sheet_name="Summary")
+    assert summary.iloc[-1].tolist() == ["Circularity Index (CI)", report["ci"]]
+
+
+def test_exports_are_cached_by_content(exporter):
+    report = make_report("P", 2)
+    future = exporter.submit(report, "html")
+    assert future.result(timeout=120) == export.render(report, "html")
+    assert exporter.submit(make_report("P", 2), "html") is future
+
+
+def test_batch_export_zip_archive(exporter):
+    reports = [make_report(name, seed) for seed, name in enumerate(["A/1", "B", "A/1"])]
+    files = exporter.submit_batch(reports, "html")
+    assert [name for name, _ in files] == ["001_A_1.html", "002_B.html", "003_A_1.html"]
+    for _, future in files:
+        future.result(timeout=120)
+
+    archive = zipfile.ZipFile(io.BytesIO(export.zip_archive(files)))
+    assert archive.namelist() == [name for name, _ in files]
+    assert archive.read("002_B.html") == export.render(reports[1], "html")
@@ -0,0 +1,83 @@
+import json
+
+import numpy as np
+import pytest
+
+import knowledge_base
+
+
+def document(**changes):
+    doc = {
+        "version": "test",
+        "levels": 3,
+        "default_effort": [1, 2],
+        "categories": [
+            {"name": "First", "weight": 0.6, "explanation": "First category.", "dmfs": [
+                {"id": "A1", "name": "Alpha ", "action_plans": {"1": "Start alpha", "2": "Grow alpha"}},
+                {"id": "A2", "name": "Beta", "action_plans": {"1": "b1", "2": "b2", "3": "b3"}, "effort": [4, 0]},
+            ]},
+            {"name": "Second", "weight": 0.4, "dmfs": [
+                {"id": "B1", "name": "Gamma", "action_plans": {"3": "Keep gamma"}},
+            ]},
+        ],
+    }
+    doc.update(changes)
+    return doc
+
+
+def test_compile_knowledge_base():
+    kb = knowledge_base.compile_knowledge_base(document())
+    assert kb.categories == ("First", "Second")
+    np.testing.assert_array_equal(kb.category_weights, [0.6, 0.4])
+    assert kb.category_explanations[1] == "No explanation provided."
+    assert kb.dmf_count == 3
+    assert list(kb.category_dmfs(0)) == [0, 1] and list(kb.category_dmfs(1)) == [2]
+    np.testing.assert_array_equal(kb.dmf_category, [0, 0, 1])
+    np.testing.assert_array_equal(kb.effort, [[1, 2], [4, 0], [1, 2]])
+
+
+def test_dmf_lookup_and_action_plans():
+    kb = knowledge_base.compile_knowledge_base(document())
+    assert kb.dmf_id("a2") == kb.dmf_id(" beta ") == 1
+    assert kb.dmf_id("Alpha") == 0
+    assert kb.dmf_id("Delta") is None
+    assert kb.action_plan(0, 2) == "Grow alpha"
+    assert kb.action_plan(0, 3) == knowledge_base.NO_ACTION_PLAN
+    assert kb.action_plan(2, 0) == knowledge_base.NO_ACTION_PLAN
+    assert kb.action_plan(2, 3) == "Keep gamma"
+
+
+@pytest.mark.parametrize("change, message", [
+    ({"A2": {"id": "A1"}}, "Duplicate DMF id"),
+    ({"A2": {"action_plans": {"4": "too high"}}}, "outside 1-3"),
+    ({"A2": {"effort": [1]}}, "effort must list 2"),
+    ({"A2": {"effort": [1, -1]}}, "effort must list 2"),
+])
+def test_compile_rejects_invalid_documents(change, message):
+    doc = document()
+    for dmf in doc["categories"][0]["dmfs"]:
+        dmf.update(change.get(dmf["id"], {}))
+    with pytest.raises(ValueError, match=message):
+        knowledge_base.compile_knowledge_base(doc)
+
+
+def test_validate_lists_gaps():
+    doc = document()
+    doc["categories"].append({"name": "Empty", "weight": 0.0, "dmfs": []})
+    gaps = knowledge_base.validate(knowledge_base.compile_knowledge_base(doc))
+    assert gaps == [
+        "Category 'Empty' has no DMFs",
+        "A1 (Alpha): no action plan for level(s) 3",
+        "B1 (Gamma): no action plan for level(s) 1, 2",
+    ]
+
+
+def test_shipped_knowledge_base_loads(tmp_path):
+    kb = knowledge_base.load_knowledge_base()
+    assert kb.dmf_count == len(kb.dmf_names) == len(kb.dmf_category)
+    assert kb.effort.shape == (kb.dmf_count, kb.levels - 1)
+    assert knowledge_base.load_knowledge_base() is kb
+
+    path = tmp_path / "kb.json"
+    path.write_text(json.dumps(document()), encoding="utf-8")
+    assert knowledge_base.load_knowledge_base(str(path)).version == "test"
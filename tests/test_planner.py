@@ -0,0 +1,62 @@
+import itertools
+
+import numpy as np
+import pytest
+
+import planner
+import scoring
+
+DMF_COUNT = len(scoring.DMF_CODES)
+
+
+# Smallest total effort that lifts the CI to target_ci, trying every combination of raises
+def brute_force_effort(vector, target_ci, effort, open_dmfs, max_level=5):
+    best = None
+    for raises in itertools.product(*[range(max_level - int(vector[d]) + 1) for d in open_dmfs]):
+        raised = vector.copy()
+        cost = 0
+        for d, raise_by in zip(open_dmfs, raises):
+            level = int(vector[d])
+            raised[d] = level + raise_by
+            cost += int(effort[d, level - 1:level - 1 + raise_by].sum())
+        if scoring.score(raised)[1][0] >= target_ci - 1e-9 and (best is None or cost < best):
+            best = cost
+    return best
+
+
+# Every DMF is answered at the maximum level or left unanswered, except a few open ones
+def small_case(rng, open_count=4):
+    vector = np.where(rng.random(DMF_COUNT) < 0.3, np.nan, 5.0)
+    open_dmfs = sorted(rng.choice(DMF_COUNT, open_count, replace=False).tolist())
+    vector[open_dmfs] = rng.integers(1, 5, open_count)
+    effort = rng.integers(1, 10, size=(DMF_COUNT, 4))
+    return vector, effort, open_dmfs
+
+
+@pytest.mark.parametrize("seed", range(8))
+def test_plan_upgrades_minimum_effort_matches_brute_force(seed):
+    rng = np.random.default_rng(seed)
+    vector, effort, open_dmfs = small_case(rng)
+    current = scoring.score(vector)[1][0]
+    target_ci = current + rng.uniform(0.05, 0.6)
+
+    plan = planner.plan_upgrades(vector, target_ci, effort)
+    expected = brute_force_effort(vector, target_ci, effort, open_dmfs)
+    if expected is None:
+        assert plan is None
+        return
+    assert plan is not None
+    assert sum(step[3] for step in plan) == expected
+
+    raised = vector.copy()
+    for dmf_id, from_level, to_level, _, _ in plan:
+        assert raised[dmf_id] == from_level and to_level == from_level + 1
+        raised[dmf_id] = to_level
+    assert scoring.score(raised)[1][0] >= target_ci - 1e-9
+
+
+def test_plan_upgrades_met_and_unreachable_targets():
+    vector, effort, _ = small_case(np.random.default_rng(0))
+    current = scoring.score(vector)[1][0]
+    assert planner.plan_upgrades(vector, current, effort) == []
+    assert planner.plan_upgrades(vector, 5.1, effort) is None
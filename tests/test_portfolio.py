@@ -0,0 +1,83 @@
+import numpy as np
+
+import portfolio
+import scoring
+from storage import ResponseStore
+
+DMF_COUNT = len(scoring.DMF_CODES)
+
+
+def random_survey(rng, rows=200, projects=("P1", "P2", "P3", "P4")):
+    matrix = rng.integers(1, 6, size=(rows, DMF_COUNT)).astype(float)
+    matrix[rng.random(matrix.shape) < 0.3] = np.nan
+    # One project leaves a whole category unanswered
+    names = np.array(projects, dtype=object)[rng.integers(len(projects), size=rows)]
+    matrix[np.ix_(names == projects[-1], np.flatnonzero(scoring.KNOWLEDGE_BASE.dmf_category == 0))] = np.nan
+    return names, matrix
+
+
+def level_histograms(names, matrix, levels=5):
+    project_names = sorted(set(names))
+    counts = np.zeros((len(project_names), DMF_COUNT, levels), dtype=np.int64)
+    for name, row in zip(names, matrix):
+        for dmf in np.flatnonzero(~np.isnan(row)):
+            counts[project_names.index(name), dmf, int(row[dmf]) - 1] += 1
+    return project_names, counts
+
+
+def test_project_scores_pool_the_answers_of_each_project():
+    names, matrix = random_survey(np.random.default_rng(0))
+    project_names, respondents, averages, ci = portfolio.project_scores(names, matrix)
+    assert project_names == ["P1", "P2", "P3", "P4"]
+    for i, name in enumerate(project_names):
+        rows = matrix[names == name]
+        assert respondents[i] == len(rows)
+        for c in range(len(scoring.CATEGORIES)):
+            values = rows[:, scoring.KNOWLEDGE_BASE.dmf_category == c]
+            expected = np.nanmean(values) if (~np.isnan(values)).any() else np.nan
+            np.testing.assert_allclose(averages[i, c], expected)
+    assert np.isnan(averages[3, 0])
+    np.testing.assert_allclose(ci, scoring.circularity_index(averages))
+
+
+def test_scores_from_level_counts_match_the_response_matrix():
+    names, matrix = random_survey(np.random.default_rng(1))
+    _, _, averages, _ = portfolio.project_scores(names, matrix)
+    dmf_means = portfolio.project_dmf_means(names, matrix)
+
+    _, level_counts = level_histograms(names, matrix)
+    histogram_averages, histogram_dmf_means = portfolio.scores_from_level_counts(level_counts)
+    np.testing.assert_allclose(histogram_averages, averages, rtol=1e-12)
+    np.testing.assert_allclose(histogram_dmf_means, dmf_means, rtol=1e-12)
+
+
+def test_scores_from_stored_level_counts(tmp_path):
+    names, matrix = random_survey(np.random.default_rng(2), rows=60)
+    store = ResponseStore(str(tmp_path / "responses.db"))
+    try:
+        for index, (name, row) in enumerate(zip(names, matrix)):
+            store.submit(f"r{index}", name, "1", row)
+        store.flush()
+        stored_names, respondents, level_counts = store.project_levels(DMF_COUNT)
+    finally:
+        store.close()
+
+    project_names, respondent_counts, averages, _ = portfolio.project_scores(names, matrix)
+    assert stored_names == project_names
+    np.testing.assert_array_equal(respondents, respondent_counts)
+    histogram_averages, histogram_dmf_means = portfolio.scores_from_level_counts(level_counts)
+    np.testing.assert_allclose(histogram_averages, averages, rtol=1e-12)
+    np.testing.assert_allclose(histogram_dmf_means, portfolio.project_dmf_means(names, matrix), rtol=1e-12)
+
+
+def test_rank_projects_is_stable():
+    assert portfolio.rank_projects([2.0, 3.0, 2.0, 1.0]).tolist() == [1, 0, 2, 3]
+
+
+def test_render_radars_in_a_pool():
+    pool = portfolio.make_render_pool(1)
+    try:
+        images = portfolio.render_radars(pool, scoring.CATEGORIES, np.array([[1, 2, 3, 4, 5], [5, 4, 3, 2, 1.0]]))
+    finally:
+        pool.shutdown()
+    assert len(images) == 2 and all(image.startswith(b"\x89PNG") for image in images)
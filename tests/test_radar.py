@@ -0,0 +1,57 @@
+from functools import lru_cache
+
+import matplotlib.pyplot as plt
+import pytest
+
+import radar
+
+CATEGORIES = ("One", "Two", "Three", "Four", "Five")
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    radar.clear_cache()
+    yield
+    radar.clear_cache()
+
+
+def test_render_radar_formats():
+    assert radar.render_radar(CATEGORIES, [1, 2, 3, 4, 5]).startswith(b"\x89PNG")
+    assert b"<svg" in radar.render_radar(CATEGORIES, [1, 2, 3, 4, 5], fmt="svg")
+
+
+def test_rounded_values_share_a_cache_entry():
+    first = radar.render_radar(CATEGORIES, [1, 2, 3, 4, 5.001])
+    assert radar.render_radar(CATEGORIES, [1, 2, 3, 4, 4.999]) is first
+    assert radar.cache_info().hits == 1
+    assert radar.render_radar(CATEGORIES, [1, 2, 3, 4, 4.5]) != first
+
+
+def test_charts_do_not_depend_on_what_the_template_drew_before():
+    first = radar.render_radar(CATEGORIES, [1, 2, 3, 4, 5])
+    radar.render_radar(CATEGORIES, [5, 4, 3, 2, 1])
+    radar._render_radar.cache_clear()
+    assert radar.render_radar(CATEGORIES, [1, 2, 3, 4, 5]) == first
+
+
+def test_no_pyplot_figures_are_left_open():
+    before = plt.get_fignums()
+    for value in range(20):
+        radar.render_radar(CATEGORIES, [value / 4] * 5, dpi=10)
+    assert plt.get_fignums() == before
+
+
+def test_chart_cache_and_templates_are_bounded(monkeypatch):
+    assert radar._render_radar.cache_parameters()["maxsize"] == radar.RADAR_CACHE_SIZE
+    # The same renderer behind a smaller cache, so eviction is seen without rendering hundreds of charts
+    monkeypatch.setattr(radar, "_render_radar", lru_cache(maxsize=4)(radar._render_radar.__wrapped__))
+    for index in range(6):
+        radar.render_radar(CATEGORIES, [index] * 5, dpi=10)
+    assert radar.cache_info().currsize == 4
+    radar.render_radar(CATEGORIES, [0] * 5, dpi=10)
+    assert radar.cache_info().hits == 0
+
+    for count in range(3, 3 + radar.TEMPLATE_CACHE_SIZE + 2):
+        radar.render_radar([f"C{i}" for i in range(count)], [1] * count, dpi=10)
+    assert len(radar._templates) == radar.TEMPLATE_CACHE_SIZE
+    assert tuple(f"C{i}" for i in range(3)) not in radar._templates
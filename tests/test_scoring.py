@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+import scoring
+
+KB = scoring.KNOWLEDGE_BASE
+
+
+# The per-category loop the report used before scoring was vectorized, for one respondent's
+# {DMF name: level} answers
+def reference_score(answers):
+    averages = {}
+    for c, category in enumerate(KB.categories):
+        responses = [answers[name] for name, dmf_category in zip(KB.dmf_names, KB.dmf_category)
+                     if dmf_category == c and name in answers]
+        if responses:
+            averages[category] = np.mean(responses)
+    ci = sum(averages.get(category, 0) * weight for category, weight in zip(KB.categories, KB.category_weights))
+    return averages, ci
+
+
+def random_matrix(rng, rows, unanswered):
+    matrix = rng.integers(1, 6, size=(rows, len(KB.dmf_names))).astype(float)
+    matrix[rng.random(matrix.shape) < unanswered] = np.nan
+    return matrix
+
+
+@pytest.mark.parametrize("unanswered", [0.0, 0.3, 0.9, 1.0])
+def test_score_matches_per_category_loop(unanswered):
+    matrix = random_matrix(np.random.default_rng(7), 50, unanswered)
+    averages, ci = scoring.score(matrix)
+
+    for row, row_averages, row_ci in zip(matrix, averages, ci):
+        answers = {name: level for name, level in zip(KB.dmf_names, row) if not np.isnan(level)}
+        expected_averages, expected_ci = reference_score(answers)
+        for category, average in zip(KB.categories, row_averages):
+            if category in expected_averages:
+                assert average == pytest.approx(expected_averages[category])
+            else:
+                assert np.isnan(average)
+        assert row_ci == pytest.approx(expected_ci)
+
+
+def test_score_with_per_row_weights():
+    rng = np.random.default_rng(3)
+    matrix = random_matrix(rng, 20, 0.2)
+    weights = rng.dirichlet(np.ones(len(KB.categories)), size=len(matrix))
+    averages, ci = scoring.score(matrix, weights)
+    for row_averages, row_weights, row_ci in zip(averages, weights, ci):
+        assert row_ci == pytest.approx(np.nansum(row_averages * row_weights))
+
+
+def test_levels_to_vector_marks_zero_unanswered():
+    levels = np.zeros(len(KB.dmf_names), dtype=np.int8)
+    levels[[0, 5]] = (3, 4)
+    vector = scoring.levels_to_vector(levels)
+    assert vector[0] == 3 and vector[5] == 4
+    assert np.isnan(np.delete(vector, [0, 5])).all()
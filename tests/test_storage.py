@@ -0,0 +1,92 @@
+import numpy as np
+import pytest
+
+import scoring
+from storage import ResponseStore
+
+DMF_COUNT = len(scoring.DMF_CODES)
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ResponseStore(str(tmp_path / "responses.db"))
+    yield store
+    store.close()
+
+
+# Reader connection that lets the writer commit a submission right after the first query it runs
+class InterleavedReader:
+    def __init__(self, connection, write):
+        self.connection = connection
+        self.write = write
+
+    def execute(self, sql, parameters=()):
+        cursor = self.connection.execute(sql, parameters)
+        if sql.lstrip().upper().startswith("SELECT") and self.write is not None:
+            write, self.write = self.write, None
+            write()
+        return cursor
+
+    def __getattr__(self, name):
+        return getattr(self.connection, name)
+
+
+def test_load_responses_ignores_submissions_committed_while_reading(store):
+    store.submit("a", "P", "1", np.full(DMF_COUNT, 3))
+    store.flush()
+
+    def submit_another():
+        store.submit("b", "P", "1", np.full(DMF_COUNT, 4))
+        store.flush()
+
+    store._reader = InterleavedReader(store._reader, submit_another)
+    submission_ids, projects, matrix = store.load_responses(DMF_COUNT, "P")
+    assert projects == ["P"]
+    np.testing.assert_array_equal(matrix, np.full((1, DMF_COUNT), 3.0))
+    assert len(store.load_responses(DMF_COUNT, "P")[0]) == 2
+
+
+def test_submissions_round_trip(store):
+    levels = np.zeros(DMF_COUNT, dtype=np.int8)
+    levels[[0, 4, 7]] = (1, 5, 3)
+    store.submit("a", "P", "1", levels)
+    store.submit("b", "Q", "1", np.full(DMF_COUNT, np.nan))
+    store.flush()
+
+    _, projects, matrix = store.load_responses(DMF_COUNT)
+    assert projects == ["P", "Q"]
+    np.testing.assert_array_equal(matrix[0], scoring.levels_to_vector(levels))
+    assert np.isnan(matrix[1]).all()
+    assert store.projects() == ["P", "Q"]
+
+
+@pytest.mark.parametrize("same_batch", [False, True])
+def test_resubmission_replaces_earlier_submission(store, same_batch):
+    store.submit("a", "P", "1", np.full(DMF_COUNT, 2))
+    if not same_batch:
+        store.flush()
+    store.submit("a", "Q", "1", np.full(DMF_COUNT, 5))
+    store.submit("b", "P", "1", np.full(DMF_COUNT, 1))
+    store.flush()
+
+    _, projects, matrix = store.load_responses(DMF_COUNT)
+    assert sorted(zip(projects, matrix[:, 0])) == [("P", 1.0), ("Q", 5.0)]
+
+    # The replaced submission no longer counts towards the aggregates either
+    summary = store.portfolio_summary(DMF_COUNT, len(scoring.CATEGORIES), "P")
+    assert summary["respondents"] == 1
+    assert summary["dmf_mean"][0] == 1.0
+    assert store.portfolio_summary(DMF_COUNT, len(scoring.CATEGORIES))["respondents"] == 2
+
+
+def test_project_levels_drops_projects_without_submissions(store):
+    store.submit("a", "P", "1", np.full(DMF_COUNT, 2))
+    store.flush()
+    store.submit("a", "Q", "1", np.full(DMF_COUNT, 4))
+    store.flush()
+
+    names, respondents, level_counts = store.project_levels(DMF_COUNT)
+    assert names == ["Q"]
+    np.testing.assert_array_equal(respondents, [1])
+    np.testing.assert_array_equal(level_counts[0, :, 3], np.ones(DMF_COUNT))
+    assert level_counts.sum() == DMF_COUNT
@@ -0,0 +1,84 @@
+import numpy as np
+import pytest
+
+import scoring
+import uncertainty
+
+DMF_COUNT = len(scoring.DMF_CODES)
+
+
+def random_matrix(rng, rows, unanswered=0.2):
+    matrix = rng.integers(1, 6, size=(rows, DMF_COUNT)).astype(float)
+    matrix[rng.random(matrix.shape) < unanswered] = np.nan
+    return matrix
+
+
+# Draws of the exact bootstrap, whatever the number of respondents
+def exact_draws(monkeypatch, matrix, **kwargs):
+    with monkeypatch.context() as patch:
+        patch.setattr(uncertainty, "EXACT_BOOTSTRAP_LIMIT", len(matrix))
+        return uncertainty.monte_carlo_ci(matrix, **kwargs)
+
+
+def test_perturbed_weights_keep_their_total():
+    draws = uncertainty.perturb_weights(scoring.CATEGORY_WEIGHTS, 1000, rng=0)
+    assert (draws > 0).all()
+    np.testing.assert_allclose(draws.sum(axis=1), scoring.CATEGORY_WEIGHTS.sum())
+    np.testing.assert_allclose(draws.mean(axis=0), scoring.CATEGORY_WEIGHTS, atol=0.005)
+
+
+def test_single_respondent_only_varies_the_weights():
+    vector = random_matrix(np.random.default_rng(1), 1)
+    draws = uncertainty.monte_carlo_ci(vector, n_draws=20_000, seed=2)
+    _, ci = scoring.score(vector)
+    assert draws.mean() == pytest.approx(ci[0], abs=0.01)
+    assert draws.min() < ci[0] < draws.max()
+
+
+def test_normal_approximation_matches_exact_bootstrap_on_dense_data(monkeypatch):
+    matrix = random_matrix(np.random.default_rng(3), 400)
+    approximate = uncertainty.monte_carlo_ci(matrix, n_draws=20_000, seed=4)
+    exact = exact_draws(monkeypatch, matrix, n_draws=20_000, seed=4)
+    assert approximate.mean() == pytest.approx(exact.mean(), abs=0.005)
+    assert approximate.std() == pytest.approx(exact.std(), rel=0.1)
+    np.testing.assert_allclose(uncertainty.confidence_interval(approximate),
+                               uncertainty.confidence_interval(exact), atol=0.01)
+
+
+def test_sparse_category_uses_exact_bootstrap(monkeypatch):
+    matrix = random_matrix(np.random.default_rng(5), 300, unanswered=0.0)
+    sparse = scoring.KNOWLEDGE_BASE.dmf_category == 0
+    matrix[2:, sparse] = np.nan
+    matrix[:2, sparse] = 5
+
+    draws = uncertainty.monte_carlo_ci(matrix, n_draws=20_000, seed=6)
+    np.testing.assert_array_equal(draws, exact_draws(monkeypatch, matrix, n_draws=20_000, seed=6))
+    # Resamples without either respondent of the sparse category drop its contribution entirely
+    low, high = uncertainty.confidence_interval(draws)
+    assert low < high - 0.5
+
+
+def test_sensitivity_moves_one_dmf_at_a_time():
+    vector = np.full(DMF_COUNT, 3.0)
+    vector[0], vector[1], vector[2] = 1, 5, np.nan
+    down, up = uncertainty.sensitivity(vector)
+    assert down[0] == 0 and up[0] > 0
+    assert up[1] == 0 and down[1] < 0
+    assert down[2] == up[2] == 0
+
+    raised = vector.copy()
+    raised[3] += 1
+    assert up[3] == pytest.approx(scoring.score(raised)[1][0] - scoring.score(vector)[1][0])
+    order = uncertainty.tornado_order(down, up)
+    assert np.abs(up - down)[order[0]] == np.abs(up - down).max()
+
+
+def test_draws_centre_on_the_pooled_ci():
+    matrix = random_matrix(np.random.default_rng(7), 40)
+    pooled = uncertainty.pooled_ci(matrix)
+    draws = uncertainty.monte_carlo_ci(matrix, n_draws=20_000, seed=8)
+    assert draws.mean() == pytest.approx(pooled, abs=0.01)
+    low, high = uncertainty.confidence_interval(draws)
+    assert low < pooled < high
+    no_bootstrap = uncertainty.monte_carlo_ci(matrix, n_draws=20_000, bootstrap=False, seed=8)
+    assert no_bootstrap.mean() == pytest.approx(pooled, abs=0.005)
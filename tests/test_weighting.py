@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+import weighting
+
+CATEGORIES = ("a", "b", "c", "d", "e")
+WEIGHTS = np.array([0.4, 0.25, 0.15, 0.12, 0.08])
+
+
+def consistent_matrix(weights):
+    return weights[:, None] / weights[None, :]
+
+
+def test_derive_weight_set_recovers_consistent_weights():
+    weight_set = weighting.derive_weight_set("panel", "1", CATEGORIES, [consistent_matrix(WEIGHTS)] * 3)
+    np.testing.assert_allclose(weight_set.weights, WEIGHTS, atol=1e-12)
+    assert weight_set.consistency_ratio == pytest.approx(0.0, abs=1e-9)
+    assert weight_set.excluded_experts == ()
+
+
+def test_derive_weight_set_accepts_rounded_judgments():
+    rounded = np.round(consistent_matrix(WEIGHTS), 2)
+    weight_set = weighting.derive_weight_set("panel", "1", CATEGORIES, [rounded])
+    np.testing.assert_allclose(weight_set.weights, WEIGHTS, atol=1e-3)
+
+
+def test_derive_weight_set_excludes_inconsistent_experts():
+    inconsistent = np.ones((5, 5))
+    inconsistent[0, 1], inconsistent[1, 2], inconsistent[0, 2] = 9, 9, 1 / 9
+    inconsistent[1, 0], inconsistent[2, 1], inconsistent[2, 0] = 1 / 9, 1 / 9, 9
+    weight_set = weighting.derive_weight_set("panel", "1", CATEGORIES, [consistent_matrix(WEIGHTS), inconsistent],
+                                             expert_ids=["consistent", "inconsistent"])
+    assert weight_set.excluded_experts == ("inconsistent",)
+    np.testing.assert_allclose(weight_set.weights, WEIGHTS, atol=1e-12)
+
+
+def test_check_matrices_rejects_non_reciprocal_judgments():
+    matrix = consistent_matrix(WEIGHTS)
+    matrix[1, 0] = 1.0
+    with pytest.raises(ValueError, match="not reciprocal"):
+        weighting.check_matrices([matrix], len(CATEGORIES))
+
+
+def test_registry_round_trip_and_unknown_assignments(tmp_path, caplog):
+    kb = weighting.knowledge_base.load_knowledge_base()
+    panel = weighting.derive_weight_set("panel", "1", kb.categories, [consistent_matrix(WEIGHTS)])
+    registry = weighting.WeightRegistry(kb, [panel], {"A": "panel", "B": "panel@1", "C": "missing@2"})
+    path = str(tmp_path / "weight_sets.json")
+    weighting.save_registry(registry, path)
+
+    with caplog.at_level("WARNING", logger="weighting"):
+        loaded = weighting.load_registry(path)
+    assert "missing@2" in caplog.text
+    np.testing.assert_array_equal(loaded.get("panel@1").weights, panel.weights)
+    assert loaded.for_project("A") is loaded.for_project("B") is loaded.get("panel")
+    assert loaded.for_project("C") is loaded.default
+    assert loaded.for_project("unassigned") is loaded.default
+    assert loaded.unknown_assignments() == {"C": "missing@2"}
+
+    weights = loaded.weights_for_projects(["C", "A", "A"])
+    np.testing.assert_array_equal(weights, [kb.category_weights, panel.weights, panel.weights])
+    with pytest.raises(KeyError):
+        loaded.get("missing")
@@ -0,0 +1,112 @@
+import numpy as np
+
+import scoring
+
+# Upper bound on the number of elements in one bootstrap block (draws x respondents),
+# which keeps memory flat when many respondents are resampled
+_BLOCK_ELEMENTS = 1 << 22
+
+# Above this many respondents the resampled totals are drawn from their normal approximation
+# instead of resampling respondents one by one, so the cost stops growing with the sample
+EXACT_BOOTSTRAP_LIMIT = 256
+
+# The normal approximation is only used when every answered category has at least this many
+# answering respondents; a ratio of totals near zero answers is neither normal nor bounded
+MIN_ANSWERED_FOR_APPROXIMATION = 30
+
+
+# Random category weights around the base weights. Draws come from a Dirichlet distribution, so they
+# stay positive and keep the total of the base weights; a larger concentration means less spread.
+def perturb_weights(weights, n_draws, concentration=200.0, rng=None):
+    rng = np.random.default_rng(rng)
+    weights = np.asarray(weights, dtype=float)
+    total = weights.sum()
+    return rng.dirichlet(weights / total * concentration, size=n_draws) * total
+
+
+# Per-respondent category sums and answer counts of a (respondents x DMF) response matrix
+def _category_totals(matrix):
+    answered = ~np.isnan(matrix)
+    return np.where(answered, matrix, 0.0) @ scoring.CATEGORY_MEMBERSHIP, answered @ scoring.CATEGORY_MEMBERSHIP
+
+
+# CI of the category averages over all answers of a (respondents x DMF) response matrix, the point
+# estimate that monte_carlo_ci draws around
+def pooled_ci(matrix, weights=scoring.CATEGORY_WEIGHTS):
+    sums, counts = _category_totals(np.atleast_2d(np.asarray(matrix, dtype=float)))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        averages = sums.sum(axis=0) / counts.sum(axis=0)
+    return float(scoring.circularity_index(averages, weights))
+
+
+# Monte Carlo draws of the pooled CI of a (respondents x DMF) response matrix.
+# Each draw combines perturbed category weights with, when there is more than one respondent,
+# a bootstrap resample of the respondents.
+def monte_carlo_ci(matrix, weights=scoring.CATEGORY_WEIGHTS, n_draws=100_000, concentration=200.0,
+                   bootstrap=True, seed=None):
+    rng = np.random.default_rng(seed)
+    matrix = np.atleast_2d(np.asarray(matrix, dtype=float))
+    # Per-respondent category sums and answer counts; a resample only re-weights these rows
+    sums, counts = _category_totals(matrix)
+    n_respondents = len(matrix)
+
+    weight_draws = perturb_weights(weights, n_draws, concentration, rng)
+    if not bootstrap or n_respondents < 2:
+        with np.errstate(invalid="ignore", divide="ignore"):
+            averages = sums.sum(axis=0) / counts.sum(axis=0)
+        return weight_draws @ np.nan_to_num(averages, nan=0.0)
+
+    answered_rows = np.count_nonzero(counts, axis=0)
+    dense = np.all((answered_rows == 0) | (answered_rows >= MIN_ANSWERED_FOR_APPROXIMATION))
+    if n_respondents > EXACT_BOOTSTRAP_LIMIT and dense:
+        # A resample's (category sums, category counts) totals are a sum of n i.i.d. rows, which is
+        # approximately normal with n times the mean and covariance of a single row
+        rows = np.hstack([sums, counts])
+        totals = rng.multivariate_normal(n_respondents * rows.mean(axis=0),
+                                         n_respondents * np.cov(rows, rowvar=False), size=n_draws,
+                                         method="eigh")
+        n_categories = sums.shape[1]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            averages = totals[:, :n_categories] / totals[:, n_categories:]
+        return np.einsum("ij,ij->i", np.nan_to_num(averages, nan=0.0), weight_draws)
+
+    draws = np.empty(n_draws)
+    block = max(1, _BLOCK_ELEMENTS // n_respondents)
+    for start in range(0, n_draws, block):
+        stop = min(start + block, n_draws)
+        size = stop - start
+        # How many times each respondent appears in each resample, counted in one bincount over
+        # (draw, respondent) cells
+        picks = rng.integers(0, n_respondents, size=(size, n_respondents))
+        picks += (np.arange(size) * n_respondents)[:, None]
+        resample = np.bincount(picks.ravel(), minlength=size * n_respondents).reshape(size, n_respondents)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            averages = (resample @ sums) / (resample @ counts)
+        draws[start:stop] = np.einsum("ij,ij->i", np.nan_to_num(averages, nan=0.0), weight_draws[start:stop])
+    return draws
+
+
+# Equal-tailed confidence interval of Monte Carlo draws
+def confidence_interval(draws, level=0.95):
+    low, high = np.percentile(draws, [50 * (1 - level), 50 * (1 + level)])
+    return low, high
+
+
+# One-at-a-time sensitivity of a respondent's CI: the CI change when each DMF moves one level down
+# and one level up (clipped to 1-5). Unanswered DMFs have no effect. Returns (down, up) arrays
+# indexed by DMF id.
+def sensitivity(vector, weights=scoring.CATEGORY_WEIGHTS):
+    vector = np.asarray(vector, dtype=float)
+    n_dmf = len(vector)
+    steps = np.array([-1.0, 1.0])[:, None, None] * np.eye(n_dmf)
+    # (2 x DMF x DMF): scenario [direction, dmf] is the vector with that single DMF moved
+    scenarios = np.clip(vector + steps, 1, 5)
+    _, base = scoring.score(vector, weights)
+    _, ci = scoring.score(scenarios.reshape(-1, n_dmf), weights)
+    deltas = np.nan_to_num(ci.reshape(2, n_dmf) - base[0], nan=0.0)
+    return deltas[0], deltas[1]
+
+
+# DMF ids ordered by the width of their sensitivity swing, largest first (tornado order)
+def tornado_order(down, up):
+    return np.argsort(-(np.abs(up - down)), kind="stable")
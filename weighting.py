@@ -0,0 +1,316 @@
+import argparse
+import hashlib
+import json
+import logging
+import os
+from functools import lru_cache
+
+import numpy as np
+
+import knowledge_base
+
+logger = logging.getLogger(__name__)
+
+# Registry of derived weight sets and of the weight set each project is scored with. Editing it
+# (or running this module's CLI) changes the weights without touching the code.
+WEIGHT_SETS_PATH = os.environ.get(
+    "KBDSS_WEIGHT_SETS", os.path.join(os.path.dirname(os.path.abspath(__file__)), "weight_sets.json"))
+
+# Weight set built from the category weights in the knowledge base, used by projects without an assignment
+DEFAULT_WEIGHT_SET = "knowledge_base"
+
+# Saaty's random consistency index by matrix size (0 for n <= 2, where every matrix is consistent)
+RANDOM_INDEX = (0.0, 0.0, 0.0, 0.58, 0.90, 1.12, 1.24, 1.32, 1.41, 1.45, 1.49, 1.51, 1.48, 1.56, 1.57, 1.59)
+
+# Experts whose judgments are less consistent than this are left out of the aggregate
+MAX_CONSISTENCY_RATIO = 0.1
+
+# Tolerance of the reciprocity check, so judgments rounded to two decimals (3 and 0.33, 7 and 0.14) are accepted
+RECIPROCAL_TOLERANCE = 0.05
+
+
+# Category weights derived from an expert panel (or taken from the knowledge base), identified by name and version
+class WeightSet:
+    def __init__(self, name, version, categories, weights, consistency_ratio=0.0, expert_consistency=None,
+                 excluded_experts=(), panel_hash=None):
+        self.name = name
+        self.version = version
+        self.categories = tuple(categories)
+        self.weights = np.array(weights, dtype=float)
+        self.weights.flags.writeable = False
+        self.consistency_ratio = consistency_ratio
+        # Consistency ratio of every expert of the panel, by expert id
+        self.expert_consistency = dict(expert_consistency or {})
+        self.excluded_experts = tuple(excluded_experts)
+        # Hash of the panel's judgments, so a version is never silently re-derived from different input
+        self.panel_hash = panel_hash
+
+    @property
+    def key(self):
+        return f"{self.name}@{self.version}"
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "version": self.version,
+            "categories": list(self.categories),
+            "weights": [float(weight) for weight in self.weights],
+            "consistency_ratio": round(float(self.consistency_ratio), 6),
+            "expert_consistency": {expert: round(float(ratio), 6) for expert, ratio in self.expert_consistency.items()},
+            "excluded_experts": list(self.excluded_experts),
+            "panel_hash": self.panel_hash,
+        }
+
+
+# Validate a stack of pairwise-comparison matrices, one (category x category) matrix per expert
+def check_matrices(matrices, size):
+    matrices = np.asarray(matrices, dtype=float)
+    if matrices.ndim != 3 or matrices.shape[1:] != (size, size):
+        raise ValueError(f"Expected {size}x{size} comparison matrices, got an array of shape {matrices.shape}")
+    if not np.all(np.isfinite(matrices) & (matrices > 0)):
+        raise ValueError("Pairwise comparisons must be positive numbers")
+    if not np.allclose(np.diagonal(matrices, axis1=1, axis2=2), 1.0):
+        raise ValueError("Pairwise comparison matrices must have ones on the diagonal")
+    reciprocal = np.abs(np.log(matrices * matrices.transpose(0, 2, 1))) > RECIPROCAL_TOLERANCE
+    if reciprocal.any():
+        expert, i, j = np.argwhere(reciprocal)[0]
+        raise ValueError(f"Comparison matrix {expert} is not reciprocal at ({i}, {j})")
+    # Only the upper triangle is kept; the lower one is rebuilt from it so rounded judgments do not skew the weights
+    row, column = np.triu_indices(size, 1)
+    matrices = matrices.copy()
+    matrices[:, column, row] = 1.0 / matrices[:, row, column]
+    return matrices
+
+
+# Principal eigenvector (normalized to sum to 1) and eigenvalue of every matrix, in one batched decomposition
+def principal_eigenvectors(matrices):
+    eigenvalues, eigenvectors = np.linalg.eig(matrices)
+    principal = eigenvalues.real.argmax(axis=-1)
+    lambda_max = np.take_along_axis(eigenvalues.real, principal[:, None], axis=-1)[:, 0]
+    # A positive matrix has a positive principal eigenvector (up to its sign)
+    vectors = np.abs(np.take_along_axis(eigenvectors.real, principal[:, None, None], axis=-1)[..., 0])
+    return vectors / vectors.sum(axis=-1, keepdims=True), lambda_max
+
+
+# Saaty's consistency ratio CR = ((lambda_max - n) / (n - 1)) / RI(n) for each matrix
+def consistency_ratios(lambda_max, size):
+    random_index = RANDOM_INDEX[size] if size < len(RANDOM_INDEX) else RANDOM_INDEX[-1]
+    if random_index == 0:
+        return np.zeros_like(lambda_max)
+    return np.maximum((lambda_max - size) / (size - 1), 0.0) / random_index
+
+
+# Aggregate the experts' judgments element by element with the geometric mean, which keeps the result reciprocal
+def aggregate_judgments(matrices):
+    return np.exp(np.log(matrices).mean(axis=0))
+
+
+def panel_hash(matrices):
+    return hashlib.sha256(np.ascontiguousarray(matrices, dtype=float).tobytes()).hexdigest()
+
+
+# Derive a weight set from an expert panel. Experts whose consistency ratio exceeds max_consistency_ratio
+# are excluded; the remaining judgments are aggregated and the weights are the principal eigenvector.
+def derive_weight_set(name, version, categories, matrices, expert_ids=None,
+                      max_consistency_ratio=MAX_CONSISTENCY_RATIO):
+    matrices = check_matrices(matrices, len(categories))
+    expert_ids = list(expert_ids) if expert_ids is not None else [f"expert{i + 1}" for i in range(len(matrices))]
+    if len(expert_ids) != len(matrices):
+        raise ValueError(f"Got {len(expert_ids)} expert ids for {len(matrices)} comparison matrices")
+
+    _, lambda_max = principal_eigenvectors(matrices)
+    ratios = consistency_ratios(lambda_max, len(categories))
+    consistent = ratios <= max_consistency_ratio
+    if not consistent.any():
+        raise ValueError(f"No expert has a consistency ratio of at most {max_consistency_ratio} "
+                         f"(lowest {ratios.min():.3f})")
+
+    aggregate = aggregate_judgments(matrices[consistent])
+    weights, aggregate_lambda = principal_eigenvectors(aggregate[None])
+    return WeightSet(
+        name, version, categories, weights[0],
+        consistency_ratio=float(consistency_ratios(aggregate_lambda, len(categories))[0]),
+        expert_consistency=dict(zip(expert_ids, ratios.tolist())),
+        excluded_experts=[expert for expert, keep in zip(expert_ids, consistent) if not keep],
+        panel_hash=panel_hash(matrices),
+    )
+
+
+# The weight sets of a registry file and the project assignments, plus the knowledge base's own weights
+class WeightRegistry:
+    def __init__(self, kb, weight_sets=(), projects=None):
+        self.default = WeightSet(DEFAULT_WEIGHT_SET, kb.version, kb.categories, kb.category_weights)
+        self.categories = kb.categories
+        # (name, version) -> WeightSet; a later version of a name supersedes the earlier ones
+        self.weight_sets = {(self.default.name, self.default.version): self.default}
+        self.latest = {self.default.name: self.default}
+        for weight_set in weight_sets:
+            self.add(weight_set)
+        # Project name -> "name" (latest version) or "name@version"
+        self.projects = dict(projects or {})
+
+    # Add a derived weight set. Versions are immutable: re-adding one is only accepted for the same panel.
+    def add(self, weight_set):
+        if weight_set.categories != self.categories:
+            raise ValueError(f"Weight set {weight_set.key} has categories {list(weight_set.categories)}, "
+                             f"the knowledge base has {list(self.categories)}")
+        existing = self.weight_sets.get((weight_set.name, weight_set.version))
+        if existing is not None and existing.panel_hash != weight_set.panel_hash:
+            raise ValueError(f"Weight set {weight_set.key} already exists with different judgments; "
+                             f"use a new version")
+        self.weight_sets[(weight_set.name, weight_set.version)] = weight_set
+        if existing is None:
+            self.latest[weight_set.name] = weight_set
+        return existing is None
+
+    # Weight set for "name" (latest version) or "name@version"
+    def get(self, reference):
+        name, _, version = reference.partition("@")
+        weight_set = self.weight_sets.get((name, version)) if version else self.latest.get(name)
+        if weight_set is None:
+            raise KeyError(f"Unknown weight set {reference!r}")
+        return weight_set
+
+    # A project assigned to a weight set that is not in the registry, as after a mistaken hand edit of the
+    # file, is scored with the default weights; load_registry logs such assignments
+    def for_project(self, project):
+        reference = self.projects.get(project)
+        if reference is None:
+            return self.default
+        try:
+            return self.get(reference)
+        except KeyError:
+            return self.default
+
+    # Project assignments whose weight set is not in the registry, as {project: reference}
+    def unknown_assignments(self):
+        unknown = {}
+        for project, reference in self.projects.items():
+            try:
+                self.get(reference)
+            except KeyError:
+                unknown[project] = reference
+        return unknown
+
+    # Weight sets of a sequence of project names: the distinct weight sets looked up and, for every
+    # name, the index of its weight set in that list
+    def project_weight_sets(self, projects):
+        names, index = np.unique(np.asarray(projects, dtype=object).astype(str), return_inverse=True)
+        return [self.for_project(name) for name in names], index.reshape(-1)
+
+    # (rows x category) weights for a sequence of project names, one row per name
+    def weights_for_projects(self, projects):
+        weight_sets, index = self.project_weight_sets(projects)
+        return np.array([weight_set.weights for weight_set in weight_sets]).reshape(-1, len(self.categories))[index]
+
+    def to_dict(self):
+        return {
+            "weight_sets": [weight_set.to_dict() for weight_set in self.weight_sets.values()
+                            if weight_set is not self.default],
+            "projects": self.projects,
+        }
+
+
+def _weight_set_from_dict(document):
+    return WeightSet(document["name"], document["version"], document["categories"], document["weights"],
+                     document.get("consistency_ratio", 0.0), document.get("expert_consistency"),
+                     document.get("excluded_experts", ()), document.get("panel_hash"))
+
+
+@lru_cache(maxsize=8)
+def _load_registry(path, modified):
+    kb = knowledge_base.load_knowledge_base()
+    if modified is None:
+        return WeightRegistry(kb)
+    with open(path, encoding="utf-8") as f:
+        document = json.load(f)
+    registry = WeightRegistry(kb, [_weight_set_from_dict(entry) for entry in document.get("weight_sets", [])],
+                              document.get("projects"))
+    for project, reference in registry.unknown_assignments().items():
+        logger.warning("%s assigns project %r to unknown weight set %r; using %s", path, project, reference,
+                       registry.default.key)
+    return registry
+
+
+# Load the registry file. The result is cached until the file changes, so new weight sets and project
+# assignments are picked up on the next page view. A missing file only holds the knowledge base weights.
+def load_registry(path=WEIGHT_SETS_PATH):
+    try:
+        modified = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        modified = None
+    return _load_registry(path, modified)
+
+
+def save_registry(registry, path=WEIGHT_SETS_PATH):
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, "w", encoding="utf-8") as f:
+        json.dump(registry.to_dict(), f, indent=2)
+        f.write("\n")
+    os.replace(temporary, path)
+
+
+# Read an expert panel file: {"name", "version", "categories" (optional, defaults to the knowledge base
+# order), "experts": [{"id", "matrix"}, ...]}. Matrices are reordered to the knowledge base categories.
+def read_panel(path, kb):
+    with open(path, encoding="utf-8") as f:
+        panel = json.load(f)
+    categories = panel.get("categories", list(kb.categories))
+    if sorted(categories) != sorted(kb.categories):
+        raise ValueError(f"Panel categories {categories} do not match the knowledge base {list(kb.categories)}")
+    order = [categories.index(category) for category in kb.categories]
+    matrices = np.array([expert["matrix"] for expert in panel["experts"]], dtype=float)
+    matrices = check_matrices(matrices, len(categories))[:, order][:, :, order]
+    return panel["name"], str(panel["version"]), [expert.get("id") or f"expert{i + 1}"
+                                                   for i, expert in enumerate(panel["experts"])], matrices
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Derive CI category weights from expert panels (AHP) and "
+                                                 "assign weight sets to projects.")
+    parser.add_argument("--registry", default=WEIGHT_SETS_PATH, help="weight set registry file")
+    commands = parser.add_subparsers(dest="command", required=True)
+    derive = commands.add_parser("derive", help="derive a weight set from a panel file and add it to the registry")
+    derive.add_argument("panel", help="JSON file with every expert's pairwise-comparison matrix")
+    derive.add_argument("--max-cr", type=float, default=MAX_CONSISTENCY_RATIO,
+                        help="exclude experts with a higher consistency ratio")
+    assign = commands.add_parser("assign", help="score a project with a weight set")
+    assign.add_argument("project")
+    assign.add_argument("weight_set", help="weight set name (latest version) or name@version")
+    commands.add_parser("list", help="list the weight sets and project assignments")
+    args = parser.parse_args(argv)
+
+    kb = knowledge_base.load_knowledge_base()
+    registry = load_registry(args.registry)
+    if args.command == "derive":
+        name, version, expert_ids, matrices = read_panel(args.panel, kb)
+        weight_set = derive_weight_set(name, version, kb.categories, matrices, expert_ids, args.max_cr)
+        print(f"{weight_set.key}: {len(expert_ids) - len(weight_set.excluded_experts)} of {len(expert_ids)} experts, "
+              f"aggregate consistency ratio {weight_set.consistency_ratio:.3f}")
+        for expert in weight_set.excluded_experts:
+            print(f"  excluded {expert} (consistency ratio {weight_set.expert_consistency[expert]:.3f})")
+        for category, weight in zip(kb.categories, weight_set.weights):
+            print(f"  {category:<40} {weight:.4f}")
+        if registry.add(weight_set):
+            save_registry(registry, args.registry)
+        else:
+            print(f"{weight_set.key} is already in the registry")
+    elif args.command == "assign":
+        try:
+            registry.get(args.weight_set)
+        except KeyError as error:
+            parser.error(error.args[0])
+        registry.projects[args.project] = args.weight_set
+        save_registry(registry, args.registry)
+    else:
+        for weight_set in registry.weight_sets.values():
+            print(f"{weight_set.key:<30} CR {weight_set.consistency_ratio:.3f}  "
+                  + " ".join(f"{weight:.3f}" for weight in weight_set.weights))
+        unknown = registry.unknown_assignments()
+        for project, reference in sorted(registry.projects.items()):
+            note = f" (unknown, uses {registry.default.key})" if project in unknown else ""
+            print(f"{project!r} -> {reference}{note}")
+
+
+if __name__ == "__main__":
+    main()